@@ -1,7 +1,7 @@
 -- ! MAY BE SUBJECT TO UPDATES
 
 CREATE TYPE genders AS ENUM ('Male', 'Female', 'Other', 'Unknown');
-CREATE TYPE status AS ENUM ('pending', 'completed', 'failed');
+CREATE TYPE status AS ENUM ('pending', 'in_progress', 'completed', 'failed', 'skipped');
 
 create table public.users (
   id bigint generated by default as identity not null,
@@ -71,12 +71,21 @@ create table public.queue (
   created_at timestamp with time zone not null default now(),
   status public.status null default 'pending'::status,
   github_id bigint null,
+  worker_id text null,
+  lease_expires_at timestamp with time zone null,
+  attempts integer not null default 0,
   constraint queue_pkey primary key (id),
   constraint queue_github_id_key unique (github_id),
   constraint queue_username_key unique (username),
   constraint queue_github_id_fkey foreign KEY (github_id) references users (github_id) on update CASCADE on delete CASCADE
 ) TABLESPACE pg_default;
 
+create index IF not exists idx_queue_pending on public.queue using btree (priority, created_at) TABLESPACE pg_default
+where status = 'pending'::status;
+
+create index IF not exists idx_queue_leases on public.queue using btree (lease_expires_at) TABLESPACE pg_default
+where status = 'in_progress'::status;
+
 
 create table public.sponsorship (
   id bigint generated by default as identity not null,
@@ -86,4 +95,30 @@ create table public.sponsorship (
   constraint unique_sponsor_sponsored unique (sponsor_id, sponsored_id),
   constraint sponsorship_sponsor_id_fkey foreign KEY (sponsor_id) references users (id) on update CASCADE on delete CASCADE,
   constraint sponsorship_sponsored_id_fkey foreign KEY (sponsored_id) references users (id) on update CASCADE on delete CASCADE
-) TABLESPACE pg_default;
\ No newline at end of file
+) TABLESPACE pg_default;
+
+-- Pages of a streamed sponsorship sync, applied to sponsorship once the last page is fetched
+create unlogged table public.sponsorship_staging (
+  github_id bigint not null,
+  direction text not null,
+  other_github_id bigint not null,
+  constraint sponsorship_staging_pkey primary key (github_id, direction, other_github_id)
+) TABLESPACE pg_default;
+
+create table public.etag_cache (
+  url text not null,
+  etag text null,
+  last_modified text null,
+  updated_at timestamp with time zone not null default now(),
+  constraint etag_cache_pkey primary key (url)
+) TABLESPACE pg_default;
+
+create table public.geocode_cache (
+  location text not null,
+  country text null,
+  hits bigint not null default 0,
+  misses bigint not null default 0,
+  last_hit_at timestamp with time zone null,
+  updated_at timestamp with time zone not null default now(),
+  constraint geocode_cache_pkey primary key (location)
+) TABLESPACE pg_default;
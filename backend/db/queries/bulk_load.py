@@ -0,0 +1,52 @@
+# This module streams large batches of rows into the database with COPY instead of INSERT statements.
+from dotenv import load_dotenv
+import io
+import os
+
+load_dotenv()
+
+# Rows above which the batch loaders (queue, placeholder users, sponsorships) use COPY
+BULK_LOAD_THRESHOLD = int(os.getenv("BULK_LOAD_THRESHOLD", 1000))
+
+
+# Formats one value for COPY's text format
+def _copyValue(value):
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+# Streams rows into a staging table with COPY, then merges them into the target with merge_sql
+# Returns the rows returned by merge_sql (empty if it has no RETURNING clause)
+def copyMerge(staging, columns, rows, merge_sql, db, params=None):
+    """
+    staging: name of the staging table, created on first use as `CREATE TEMP TABLE {staging} ({columns})`
+    columns: column definitions of the staging table, e.g. "github_id bigint"
+    rows: iterable of tuples matching the staging columns
+    merge_sql: statement moving the staged rows into their table (INSERT ... SELECT ... ON CONFLICT)
+
+    Temporary tables are never WAL-logged and are private to the connection, so concurrent
+    workers never see each other's staged rows. The staging table is emptied before every load.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copyValue(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    names = [column.split()[0] for column in columns.split(",")]
+    with db.cursor() as cur:
+        cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} ({columns});")
+        cur.execute(f"TRUNCATE {staging};")
+        cur.copy_from(buffer, staging, columns=names)
+        cur.execute(merge_sql, params)
+        merged = cur.fetchall() if cur.description else []
+        cur.execute(f"TRUNCATE {staging};")
+    db.commit()
+    return merged
@@ -0,0 +1,50 @@
+# This module stores the validators (ETag / Last-Modified) of GitHub REST responses,
+# so unchanged resources can be requested conditionally and answered with a free 304.
+
+
+# Returns the stored (etag, last_modified) of a url, or (None, None) if it was never cached
+def getEtag(url, db):
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            SELECT etag, last_modified FROM etag_cache
+            WHERE url = %s;
+            """,
+            (url,),
+        )
+        row = cur.fetchone()
+    if row:
+        return row[0], row[1]
+    return None, None
+
+
+# Stores the validators of a url, committed together with the caller's transaction
+def saveEtag(url, etag, last_modified, db):
+    if not etag and not last_modified:
+        return
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO etag_cache (url, etag, last_modified)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (url) DO UPDATE SET
+                etag = EXCLUDED.etag,
+                last_modified = EXCLUDED.last_modified,
+                updated_at = NOW();
+            """,
+            (url, etag, last_modified),
+        )
+    return
+
+
+# Removes the validators of a url (e.g. when the cached resource was deleted)
+def deleteEtag(url, db):
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM etag_cache
+            WHERE url = %s;
+            """,
+            (url,),
+        )
+    return
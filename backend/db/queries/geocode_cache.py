@@ -0,0 +1,45 @@
+# This module stores the country resolved for each cleaned GitHub location string,
+# shared by every worker so a location is only sent to Nominatim once.
+
+# Returned by getCachedCountry when a location has never been geocoded
+GEOCODE_MISS = object()
+
+
+# Returns the cached country of a cleaned location (None for a cached negative result),
+# or GEOCODE_MISS if it is not cached yet. Counts the hit.
+def getCachedCountry(location, db):
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE geocode_cache SET
+                hits = hits + 1,
+                last_hit_at = NOW()
+            WHERE location = %s
+            RETURNING country;
+            """,
+            (location,),
+        )
+        row = cur.fetchone()
+    db.commit()
+    if row:
+        return row[0]
+    return GEOCODE_MISS
+
+
+# Stores the geocoding result of a cleaned location (country None when Nominatim found nothing)
+# Counts the miss that caused the lookup
+def saveCachedCountry(location, country, db):
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO geocode_cache (location, country, misses)
+            VALUES (%s, %s, 1)
+            ON CONFLICT (location) DO UPDATE SET
+                country = EXCLUDED.country,
+                misses = geocode_cache.misses + 1,
+                updated_at = NOW();
+            """,
+            (location, country),
+        )
+    db.commit()
+    return
@@ -3,11 +3,18 @@ from dotenv import load_dotenv
 import os
 
 # Functional Imports
-import requests
+from backend.utils.github_api import TOKEN_POOL
+from backend.utils.http_session import getSession
+from backend.db.queries.bulk_load import BULK_LOAD_THRESHOLD, copyMerge
+from psycopg2.extras import execute_values
+import logging
 
 
 load_dotenv()
-GITHUB_TOKEN = os.getenv("PAT")
+# Seconds a claimed queue entry stays leased to a worker before other workers may reclaim it
+LEASE_SECONDS = int(os.getenv("QUEUE_LEASE_SECONDS", 3600))
+# Crawls of a queue entry that may fail in a row before it is marked failed
+MAX_CRAWL_ATTEMPTS = int(os.getenv("MAX_CRAWL_ATTEMPTS", 3))
 
 
 # def batchGetQueue(db):
@@ -27,15 +34,36 @@ GITHUB_TOKEN = os.getenv("PAT")
 
 
 # Batch add an array of usernames to the queue for scraping
+# Large batches (initial seeding, frontier expansion) are streamed in with COPY
 def batchAddQueue(github_ids, priority, db):
+    github_ids = list(github_ids)
+    if not github_ids:
+        return
+
+    if len(github_ids) > BULK_LOAD_THRESHOLD:
+        copyMerge(
+            "queue_load",
+            "github_id bigint",
+            [(github_id,) for github_id in github_ids],
+            """
+            INSERT INTO queue (github_id, priority, status)
+            SELECT DISTINCT github_id, %s, 'pending'::status
+            FROM queue_load
+            ON CONFLICT (github_id) DO NOTHING;
+            """,
+            db,
+            (priority,),
+        )
+        return
 
     entries = [(github_id, priority, "pending") for github_id in github_ids]
 
     with db.cursor() as cur:
-        cur.executemany(
+        execute_values(
+            cur,
             """
             INSERT INTO queue (github_id, priority, status)
-            VALUES (%s, %s, %s)
+            VALUES %s
             ON CONFLICT (github_id) DO NOTHING;
             """,
             entries,
@@ -45,13 +73,15 @@ def batchAddQueue(github_ids, priority, db):
     return
 
 
+# Failed entries get a fresh set of attempts
 def batchRequeue(db):
     with db.cursor() as cur:
         cur.execute(
             """
             UPDATE queue SET
-            status = 'pending'
-            WHERE status = 'completed';
+            status = 'pending',
+            attempts = 0
+            WHERE status IN ('completed', 'failed');
             """
         )
     db.commit()
@@ -77,50 +107,150 @@ def enqueueStaleUsers(db, days_old):
         db.commit()
 
 
-# Gets the first user inside the queue who has status="pending"
-def getFirstInQueue(db):
-    cur = db.cursor()
-    cur.execute(
-        """
-        SELECT github_id, priority FROM queue
-        WHERE status = 'pending'
-        ORDER BY priority ASC
-        LIMIT 1;
-        """
-    )
-    result = cur.fetchone()
-    cur.close()
-    if result:
-        # Map tuple to dict
-        return {"github_id": result[0], "priority": result[1]}
-    return None
+# Atomically claims up to `limit` pending users for a worker in one statement, in priority order
+# The pending-only filter lets Postgres walk the partial idx_queue_pending index instead of
+# sorting the (mostly completed) queue table
+def claimQueueBatch(db, worker_id, limit, lease_seconds=LEASE_SECONDS):
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE queue SET
+                status = 'in_progress',
+                worker_id = %s,
+                lease_expires_at = NOW() + %s * INTERVAL '1 second'
+            WHERE id IN (
+                SELECT id FROM queue
+                WHERE status = 'pending'
+                ORDER BY priority ASC, created_at ASC
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING github_id, priority, created_at;
+            """,
+            (worker_id, lease_seconds, limit),
+        )
+        rows = cur.fetchall()
+    db.commit()
+    # RETURNING does not preserve the subquery order
+    rows.sort(key=lambda row: (row[1], row[2]))
+    return [
+        {"github_id": row[0], "priority": row[1], "created_at": row[2]} for row in rows
+    ]
 
 
-# Update the status of the passed in user in the DB
-def updateStatus(github_id: int, status, db, priority=None):
+# Puts entries whose lease expired (crashed or stuck worker) back to pending, so no user is ever lost
+def reclaimExpiredLeases(db):
     with db.cursor() as cur:
-        if priority is not None:
-            cur.execute(
-                """
-                UPDATE queue SET
-                    status = %s,
-                    priority = %s
-                WHERE github_id = %s
-                """,
-                (status, priority, github_id),
-            )
-        else:
-            cur.execute(
-                """
-                UPDATE queue SET
-                    status = %s
-                WHERE github_id = %s
-                """,
-                (status, github_id),
-            )
-        db.commit()
-        print(f"Updated user status\n")
+        cur.execute(
+            """
+            UPDATE queue SET
+                status = 'pending',
+                worker_id = NULL,
+                lease_expires_at = NULL
+            WHERE status = 'in_progress'
+            AND lease_expires_at < NOW();
+            """
+        )
+        reclaimed = cur.rowcount
+    db.commit()
+    if reclaimed:
+        logging.info(f"Reclaimed {reclaimed} queue entries with expired leases")
+    return reclaimed
+
+
+# Extends the lease of entries a worker still holds
+def renewLeases(github_ids, worker_id, db, lease_seconds=LEASE_SECONDS):
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE queue SET
+                lease_expires_at = NOW() + %s * INTERVAL '1 second'
+            WHERE github_id = ANY(%s)
+            AND worker_id = %s
+            AND status = 'in_progress';
+            """,
+            (lease_seconds, list(github_ids), worker_id),
+        )
+    db.commit()
+    return
+
+
+# Hands entries a worker claimed but will not crawl back to the queue (e.g. on shutdown)
+def releaseLeases(github_ids, worker_id, db):
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE queue SET
+                status = 'pending',
+                worker_id = NULL,
+                lease_expires_at = NULL
+            WHERE github_id = ANY(%s)
+            AND worker_id = %s
+            AND status = 'in_progress';
+            """,
+            (list(github_ids), worker_id),
+        )
+    db.commit()
+    return
+
+
+# Hands entries whose crawl failed back to the queue, behind the entries of the same priority
+# Entries failing MAX_CRAWL_ATTEMPTS times in a row are marked failed until the next batchRequeue
+def retryEntries(github_ids, worker_id, db, max_attempts=MAX_CRAWL_ATTEMPTS):
+    if not github_ids:
+        return
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE queue SET
+                attempts = attempts + 1,
+                status = CASE
+                    WHEN attempts + 1 >= %s THEN 'failed'::status
+                    ELSE 'pending'::status
+                END,
+                created_at = NOW(),
+                worker_id = NULL,
+                lease_expires_at = NULL
+            WHERE github_id = ANY(%s)
+            AND worker_id = %s
+            AND status = 'in_progress'
+            RETURNING github_id, status;
+            """,
+            (max_attempts, list(github_ids), worker_id),
+        )
+        rows = cur.fetchall()
+    db.commit()
+    failed = [github_id for github_id, status in rows if status == "failed"]
+    if failed:
+        logging.warning(
+            f"Marked {len(failed)} queue entries failed after {max_attempts} attempts: {failed}"
+        )
+    return
+
+
+# Updates the status (and optionally the priority) of many users with a single statement
+# entries: iterable of (github_id, status, priority), priority None keeps the current value
+def batchUpdateStatus(entries, db):
+    if not entries:
         return
+    with db.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            UPDATE queue SET
+                status = v.status::status,
+                priority = COALESCE(v.priority, queue.priority),
+                attempts = CASE WHEN v.status = 'completed' THEN 0 ELSE queue.attempts END,
+                worker_id = NULL,
+                lease_expires_at = NULL
+            FROM (VALUES %s) AS v(github_id, status, priority)
+            WHERE queue.github_id = v.github_id
+            """,
+            list(entries),
+            template="(%s::bigint, %s, %s::bigint)",
+        )
+    db.commit()
+    return
 
 
 # Attempt to add a single username to the queue, check if the user is a real github user, and does not already exist
@@ -143,13 +273,15 @@ def addToQueue(username, db):
         "variables": {"username": username},
     }
 
+    token = TOKEN_POOL.acquire("graphql")
     headers = {
-        "Authorization": f"Bearer {GITHUB_TOKEN}",
+        "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
     }
-    response = requests.post(
+    response = getSession().post(
         "https://api.github.com/graphql", json=graphql_query, headers=headers
     )
+    TOKEN_POOL.update_from_headers(token, response.headers, "graphql")
 
     if response.status_code != 200:
         return {"success": False, "error": "GitHub API error"}, response.status_code
@@ -1,4 +1,4 @@
-from backend.db.queries.users import batchGetUserId
+from backend.db.queries.bulk_load import BULK_LOAD_THRESHOLD, copyMerge
 from psycopg2.extras import execute_values
 import logging
 
@@ -8,18 +8,7 @@ import logging
 # Batch create a sponsored relations for a specific user
 def createSponsors(sponsored, sponsor_arr, db):
     entries = [(sponsor, sponsored) for sponsor in sponsor_arr]
-
-    with db.cursor() as cur:
-        cur.executemany(
-            """
-            INSERT INTO sponsorship (sponsor_id, sponsored_id)
-            VALUES (%s, %s)
-            ON CONFLICT (sponsor_id, sponsored_id) DO NOTHING
-            """,
-            entries,
-        )
-    db.commit()
-    cur.close()
+    _createEdges(entries, db)
     return
 
 
@@ -27,37 +16,123 @@ def createSponsors(sponsored, sponsor_arr, db):
 def createSponsoring(sponsor, sponsored_arr, db):
 
     entries = [(sponsor, sponsored) for sponsored in sponsored_arr]
+    _createEdges(entries, db)
+    return
 
-    with db.cursor() as cur:
-        cur.executemany(
+
+# Inserts (sponsor_id, sponsored_id) edges, streaming large batches in with COPY
+def _createEdges(entries, db):
+    if not entries:
+        return
+
+    if len(entries) > BULK_LOAD_THRESHOLD:
+        copyMerge(
+            "sponsorship_load",
+            "sponsor_id bigint, sponsored_id bigint",
+            entries,
             """
             INSERT INTO sponsorship (sponsor_id, sponsored_id)
-            VALUES (%s, %s)
-            ON CONFLICT (sponsor_id, sponsored_id) DO NOTHING
+            SELECT DISTINCT sponsor_id, sponsored_id FROM sponsorship_load
+            ON CONFLICT (sponsor_id, sponsored_id) DO NOTHING;
             """,
-            entries,
+            db,
         )
-    db.commit()
-    cur.close()
-    return
-
-
-def _ensure_users_exist(db, github_ids: list[int]):
-    ids = list({i for i in github_ids if i is not None})
-    if not ids:
         return
+
     with db.cursor() as cur:
-        tuples = [(gid,) for gid in ids]
         execute_values(
             cur,
             """
-            INSERT INTO users (github_id)
+            INSERT INTO sponsorship (sponsor_id, sponsored_id)
             VALUES %s
-            ON CONFLICT (github_id) DO NOTHING
+            ON CONFLICT (sponsor_id, sponsored_id) DO NOTHING
             """,
-            tuples,
+            entries,
         )
     db.commit()
+    return
+
+
+# Synced user column and other end of an edge for each sponsorship direction
+EDGE_COLUMNS = {
+    "sponsors": ("sponsored_id", "sponsor_id"),
+    "sponsoring": ("sponsor_id", "sponsored_id"),
+}
+
+# Source of the latest GitHub IDs of a sync: the passed array, or the staged rows of the user
+LATEST_FROM_ARRAY = """
+    SELECT DISTINCT github_id
+    FROM unnest(%(latest)s::bigint[]) AS l(github_id)
+    WHERE github_id IS NOT NULL
+"""
+LATEST_FROM_STAGING = """
+    SELECT other_github_id
+    FROM sponsorship_staging
+    WHERE github_id = %(github_id)s AND direction = %(direction)s
+"""
+
+# Creates the synced user and the other ends of its edges that do not exist yet.
+# A user inserted concurrently by another worker makes this wait for its commit, so the
+# following SYNC_EDGES_QUERY (a new statement, with a new snapshot) sees every wanted user.
+ENSURE_USERS_QUERY = """
+WITH latest (github_id) AS ({latest})
+INSERT INTO users (github_id)
+SELECT github_id FROM latest
+UNION
+SELECT %(github_id)s::bigint
+ON CONFLICT (github_id) DO NOTHING;
+"""
+
+# Replaces all sponsorship edges on one side of a user in a single statement:
+# deletes the edges that are gone and inserts the new ones.
+# {user_column} is the column holding the synced user, {other_column} the other end.
+SYNC_EDGES_QUERY = """
+WITH latest (github_id) AS ({latest}),
+target AS (
+    SELECT id FROM users WHERE github_id = %(github_id)s::bigint
+),
+latest_ids AS (
+    SELECT u.id FROM users u JOIN latest USING (github_id)
+),
+removed AS (
+    DELETE FROM sponsorship s
+    USING target t
+    WHERE s.{user_column} = t.id
+        AND s.{other_column} IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM latest_ids l WHERE l.id = s.{other_column})
+    RETURNING 1
+),
+added AS (
+    INSERT INTO sponsorship ({user_column}, {other_column})
+    SELECT t.id, l.id FROM target t CROSS JOIN latest_ids l
+    ON CONFLICT (sponsor_id, sponsored_id) DO NOTHING
+    RETURNING 1
+)
+SELECT
+    (SELECT COUNT(*) FROM added),
+    (SELECT COUNT(*) FROM removed),
+    (SELECT COUNT(*) FROM latest);
+"""
+
+
+# Returns the (added, removed, total) number of edges of the synced direction, left uncommitted
+def _syncEdges(github_id, direction, db, latest_ids=None):
+    user_column, other_column = EDGE_COLUMNS[direction]
+    latest = LATEST_FROM_ARRAY if latest_ids is not None else LATEST_FROM_STAGING
+    params = {
+        "github_id": github_id,
+        "direction": direction,
+        "latest": list(latest_ids or []),
+    }
+    with db.cursor() as cur:
+        cur.execute(ENSURE_USERS_QUERY.format(latest=latest), params)
+        cur.execute(
+            SYNC_EDGES_QUERY.format(
+                latest=latest, user_column=user_column, other_column=other_column
+            ),
+            params,
+        )
+        return cur.fetchone()
 
 
 # Handles comparison logic between old sponsors and newly crawled, removing where applicable
@@ -65,83 +140,79 @@ def syncSponsors(user_id, latest_sponsor_ids, db):
     """
     user_id: GitHub ID of the sponsored user
     latest_sponsor_ids: iterable of GitHub IDs of sponsors
+
+    Returns the (added, removed) number of sponsor relations.
     """
-    # Ensure both ends exist as users
-    _ensure_users_exist(db, list(latest_sponsor_ids) + [user_id])
+    added, removed, _ = _syncEdges(user_id, "sponsors", db, latest_sponsor_ids)
+    db.commit()
+    if added or removed:
+        logging.info(f"Sponsor Relations: {added} created, {removed} removed")
+    return added, removed
 
-    # Map GitHub IDs -> internal users.id
-    # batchGetUserId should return a list of users.id in the same order
-    sponsored_row_id = batchGetUserId([user_id], db)[0]
-    latest_sponsor_row_ids = set(batchGetUserId(list(latest_sponsor_ids), db))
 
-    # Read existing edges using internal IDs
+def syncSponsorships(user_id, latest_sponsored_ids, db):
+    """
+    user_id: GitHub ID of the sponsor
+    latest_sponsored_ids: iterable of GitHub IDs of users they sponsor
+
+    Returns the (added, removed) number of sponsoring relations.
+    """
+    added, removed, _ = _syncEdges(user_id, "sponsoring", db, latest_sponsored_ids)
+    db.commit()
+    if added or removed:
+        logging.info(f"Sponsoring Relations: {added} created, {removed} removed")
+    return added, removed
+
+
+# Removes the staged edges of a user, left behind by a streamed sync that did not finish
+def clearStagedSponsorships(github_id, db):
     with db.cursor() as cur:
         cur.execute(
-            """
-            SELECT s.sponsor_id
-            FROM sponsorship s
-            WHERE s.sponsored_id = %s
-            """,
-            (sponsored_row_id,),
+            "DELETE FROM sponsorship_staging WHERE github_id = %s;",
+            (github_id,),
         )
-        existing_sponsor_row_ids = {row[0] for row in cur.fetchall()}
-
-    sponsors_to_remove = existing_sponsor_row_ids - latest_sponsor_row_ids
-    sponsors_to_add = latest_sponsor_row_ids - existing_sponsor_row_ids
-
-    if sponsors_to_remove:
-        with db.cursor() as cur:
-            cur.execute(
-                """
-                DELETE FROM sponsorship
-                WHERE sponsored_id = %s AND sponsor_id = ANY(%s)
-                """,
-                (sponsored_row_id, list(sponsors_to_remove)),
-            )
-
-    if sponsors_to_add:
-        createSponsors(sponsored_row_id, sponsor_arr=list(sponsors_to_add), db=db)
-        logging.info("Created Sponsor Relations")
+    db.commit()
     return
 
 
-def syncSponsorships(user_id, latest_sponsored_ids, db):
+# Stages one fetched page of a user's sponsors or sponsored users for a streamed sync
+def stageSponsorships(github_id, direction, github_ids, db):
     """
-    user_id: GitHub ID of the sponsor
-    latest_sponsored_ids: iterable of GitHub IDs of users they sponsor
+    github_id: GitHub ID of the synced user
+    direction: "sponsors" or "sponsoring"
+    github_ids: GitHub IDs of the other end of one page of edges
     """
-    # Ensure both ends exist as users
-    _ensure_users_exist(db, list(latest_sponsored_ids) + [user_id])
+    if not github_ids:
+        return
+    with db.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            INSERT INTO sponsorship_staging (github_id, direction, other_github_id)
+            VALUES %s
+            ON CONFLICT DO NOTHING;
+            """,
+            [(github_id, direction, other_id) for other_id in github_ids],
+        )
+    db.commit()
+    return
 
-    # Map GitHub IDs -> internal users.id
-    sponsor_row_id = batchGetUserId([user_id], db)[0]
-    latest_sponsored_row_ids = set(batchGetUserId(list(latest_sponsored_ids), db))
 
+# Applies the staged edges of one direction in a single statement, then clears the staging rows
+# Returns the number of edges of the direction
+def syncStagedSponsorships(github_id, direction, db):
+    added, removed, total = _syncEdges(github_id, direction, db)
     with db.cursor() as cur:
         cur.execute(
             """
-            SELECT s.sponsored_id
-            FROM sponsorship s
-            WHERE s.sponsor_id = %s
+            DELETE FROM sponsorship_staging
+            WHERE github_id = %s AND direction = %s;
             """,
-            (sponsor_row_id,),
+            (github_id, direction),
         )
-        existing_sponsored_row_ids = {row[0] for row in cur.fetchall()}
-
-    sponsoring_to_remove = existing_sponsored_row_ids - latest_sponsored_row_ids
-    sponsoring_to_add = latest_sponsored_row_ids - existing_sponsored_row_ids
-
-    if sponsoring_to_remove:
-        with db.cursor() as cur:
-            cur.execute(
-                """
-                DELETE FROM sponsorship
-                WHERE sponsor_id = %s AND sponsored_id = ANY(%s)
-                """,
-                (sponsor_row_id, list(sponsoring_to_remove)),
-            )
-
-    if sponsoring_to_add:
-        createSponsoring(sponsor_row_id, sponsored_arr=list(sponsoring_to_add), db=db)
-        logging.info("Created Sponsoring Relations")
-    return
+    db.commit()
+    if added or removed:
+        logging.info(
+            f"Streamed {direction} relations: {added} created, {removed} removed ({total} total)"
+        )
+    return total
@@ -3,131 +3,263 @@ from dotenv import load_dotenv
 import os
 
 # Functional Imports
-from backend.utils.github_api import postRequest
+from backend.utils.github_api import postRequest, asyncPostRequest
+from psycopg2.extras import execute_values
 from datetime import datetime
 import json
 import base64
 
 # Logging Imports
 import logging
-import time
-from backend.logs.logger_config import log_section
 
 # Load sensitive variables
 load_dotenv()
 URL = "https://api.github.com/graphql"
 GITHUB_TOKEN = os.getenv("PAT")
+# "aliased" packs several years into one query (one contributionsCollection alias per year),
+# "yearly" sends one query per year
+ACTIVITY_QUERY_MODE = os.getenv("ACTIVITY_QUERY_MODE", "aliased").lower()
+# Years per aliased query, keeps each document within GitHub's query complexity limits
+ACTIVITY_YEARS_PER_QUERY = int(os.getenv("ACTIVITY_YEARS_PER_QUERY", 10))
+# Most recent years (1 = only the current year) refreshed every ACTIVITY_REFRESH_DAYS days,
+# older years are frozen once fetched after they ended
+ACTIVITY_OPEN_YEARS = int(os.getenv("ACTIVITY_OPEN_YEARS", 1))
+ACTIVITY_REFRESH_DAYS = int(os.getenv("ACTIVITY_REFRESH_DAYS", 30))
 
 
-# Return the last year of user activity for the passed in user (PR, commits, issues)
-def getUserActivity(github_id, user_id, user_type, created_at, db=None):
+ACTIVITY_QUERY = """
+query($node_id: ID!, $from: DateTime!, $to: DateTime!) {
+    node(id: $node_id) {
+        ... on User {
+            contributionsCollection(from: $from, to: $to) {
+                totalCommitContributions,
+                totalPullRequestContributions,
+                totalIssueContributions,
+                totalPullRequestReviewContributions
+            }
+        }
+    }
+}
+"""
+
+CONTRIBUTION_FIELDS = """
+fragment ContributionFields on ContributionsCollection {
+    totalCommitContributions,
+    totalPullRequestContributions,
+    totalIssueContributions,
+    totalPullRequestReviewContributions
+}
+"""
 
-    start = int(time.time())
 
+# Returns the years (creation year through the current year) to collect activity for
+def activityYears(created_at):
     # Get year account was created from datetime string
-    node_id = base64.b64encode(f"04:User{github_id}".encode("utf-8")).decode("utf-8")
     dt = datetime.strptime(created_at, "%Y-%m-%dT%H:%M:%SZ")
-    creation_year = dt.year
-    current_year = datetime.now().year
+    return range(dt.year, datetime.now().year + 1)
 
-    with db.cursor() as cur:
 
-        # If the user is type org, the account cannot have any of the specified user activities
-        if user_type == "Organization":
-            logging.info(
-                f"Account is of type {user_type}, No user activity available to query."
-            )
-            return
-
-        log_section(f"Collecting User Activity Data via GraphQL")
-        query_template = """
-        query($node_id: ID!, $from: DateTime!, $to: DateTime!) {
-            node(id: $node_id) {
-                ... on User {
-                    contributionsCollection(from: $from, to: $to) {
-                        totalCommitContributions,
-                        totalPullRequestContributions,
-                        totalIssueContributions,
-                        totalPullRequestReviewContributions
-                    }
-                }
-            }
+def activityNodeId(github_id):
+    return base64.b64encode(f"04:User{github_id}".encode("utf-8")).decode("utf-8")
+
+
+# Builds the contributionsCollection payload for a single year of a user's activity
+def activityQuery(github_id, year):
+    node_id = activityNodeId(github_id)
+    from_date = f"{year}-01-01T00:00:00Z"
+    to_date = f"{year}-12-31T23:59:59Z"
+    variables = {"node_id": node_id, "from": from_date, "to": to_date}
+    return {"query": ACTIVITY_QUERY, "variables": variables}
+
+
+# Builds one payload with an aliased contributionsCollection (y<year>) for each of the passed years
+def batchActivityQuery(github_id, years):
+    query_parts = [
+        f'y{year}: contributionsCollection(from: "{year}-01-01T00:00:00Z", '
+        f'to: "{year}-12-31T23:59:59Z") {{ ...ContributionFields }}'
+        for year in years
+    ]
+    query = (
+        "query($node_id: ID!) { rateLimit { cost remaining resetAt } "
+        "node(id: $node_id) { ... on User { "
+        + " ".join(query_parts)
+        + " } } }"
+        + CONTRIBUTION_FIELDS
+    )
+    return {"query": query, "variables": {"node_id": activityNodeId(github_id)}}
+
+
+# Maps the aliased response of a batched activity query back onto {year: stats}
+# Years the API returned an error for are left out, like failed years of the yearly mode
+def parseActivityBatch(data, years):
+    if "errors" in data:
+        logging.error(
+            f"GraphQL Error for user at years {list(years)}: {data['errors']}"
+        )
+
+    node = (data.get("data") or {}).get("node") or {}
+    activity = {}
+    for year in years:
+        contributions = node.get(f"y{year}")
+        if contributions is None:
+            continue
+        activity[year] = parseContributions(contributions, year)
+        logging.info(f" -> Year {year}: {json.dumps(activity[year])}")
+    return activity
+
+
+# Splits the activity years into the chunks sent per aliased query
+def activityChunks(years):
+    years = list(years)
+    return [
+        years[i : i + ACTIVITY_YEARS_PER_QUERY]
+        for i in range(0, len(years), ACTIVITY_YEARS_PER_QUERY)
+    ]
+
+
+# Maps a contributionsCollection object onto the stats stored in user_activity.activity_data
+def parseContributions(contributions, year):
+    if contributions:
+        # Create a dictionary of the user stats to grab
+        return {
+            "commits": contributions.get("totalCommitContributions", 0),
+            "pull_requests": contributions.get("totalPullRequestContributions", 0),
+            "issues": contributions.get("totalIssueContributions", 0),
+            "reviews": contributions.get("totalPullRequestReviewContributions", 0),
         }
-        """
+    logging.warning(f"No contribution data for user in {year}. Inserting zero record.")
+    return {
+        "commits": 0,
+        "pull_requests": 0,
+        "issues": 0,
+        "reviews": 0,
+    }
 
-        for year in range(creation_year, current_year + 1):
-            try:
 
-                from_date = f"{year}-01-01T00:00:00Z"
-                to_date = f"{year}-12-31T23:59:59Z"
-                variables = {"node_id": node_id, "from": from_date, "to": to_date}
+# Queries the GraphQL API for the passed years (default: every year since the account was
+# created), returning {year: stats}
+def fetchUserActivity(github_id, created_at, years=None):
+    if years is None:
+        years = activityYears(created_at)
+    if ACTIVITY_QUERY_MODE == "yearly":
+        return fetchYearlyActivity(github_id, years)
 
-                query = {"query": query_template, "variables": variables}
+    activity = {}
+    for chunk in activityChunks(years):
+        try:
+            response = postRequest(URL, json=batchActivityQuery(github_id, chunk))
+            activity.update(parseActivityBatch(response.json(), chunk))
+        except Exception as e:
+            logging.error(
+                f"An unexpected error occurred for user at years {chunk}: {e}"
+            )
+    return activity
 
-                response = postRequest(URL, json=query)
-                response.raise_for_status()  # Raise an exception for bad status codes
-                data = response.json()
 
-                if "errors" in data:
-                    logging.error(
-                        f"GraphQL Error for user at year ({year}): {data['errors']}"
-                    )
-                    continue  # Skip to the next year on error
+# Queries the GraphQL API year by year, returning a dict of {year: stats}
+def fetchYearlyActivity(github_id, years):
+    activity = {}
+    for year in years:
+        try:
+            response = postRequest(URL, json=activityQuery(github_id, year))
+            response.raise_for_status()  # Raise an exception for bad status codes
+            data = response.json()
 
-                # CORRECTED: Look for 'node' instead of 'user'
-                contributions = (
-                    data.get("data", {}).get("node", {}).get("contributionsCollection")
+            if "errors" in data:
+                logging.error(
+                    f"GraphQL Error for user at year ({year}): {data['errors']}"
                 )
+                continue  # Skip to the next year on error
 
-                if contributions:
-                    # Create a dictionary of the user stats to grab
-                    stats = {
-                        "commits": contributions.get("totalCommitContributions", 0),
-                        "pull_requests": contributions.get(
-                            "totalPullRequestContributions", 0
-                        ),
-                        "issues": contributions.get("totalIssueContributions", 0),
-                        "reviews": contributions.get(
-                            "totalPullRequestReviewContributions", 0
-                        ),
-                    }
-                else:
-                    logging.warning(
-                        f"No contribution data for user in {year}. Inserting zero record."
-                    )
-                    stats = {
-                        "commits": 0,
-                        "pull_requests": 0,
-                        "issues": 0,
-                        "reviews": 0,
-                    }
-
-                # Convert the dictionary to a JSON string. This works for both JSON and JSONB columns.
-                stats_json = json.dumps(stats)
-
-                logging.info(f" -> Year {year}: {stats_json}")
-
-                cur.execute(
-                    """
-                    INSERT INTO user_activity (user_id, year, activity_data)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (user_id, year) DO UPDATE SET
-                        activity_data = EXCLUDED.activity_data,
-                        last_updated = NOW();
-                    """,
-                    (user_id, year, stats_json),
-                )
+            contributions = (
+                data.get("data", {}).get("node", {}).get("contributionsCollection")
+            )
+            activity[year] = parseContributions(contributions, year)
+            logging.info(f" -> Year {year}: {json.dumps(activity[year])}")
+
+        except Exception as e:
+            logging.error(
+                f"An unexpected error occurred for user at year ({year}): {e}"
+            )
+            continue  # Skip to next year
+    return activity
 
-            except Exception as e:
+
+# Async counterpart of fetchUserActivity used by the concurrent crawl engine
+async def asyncFetchUserActivity(client, github_id, created_at, years=None):
+    if years is None:
+        years = activityYears(created_at)
+    if ACTIVITY_QUERY_MODE == "yearly":
+        return await asyncFetchYearlyActivity(client, github_id, years)
+
+    activity = {}
+    for chunk in activityChunks(years):
+        try:
+            response = await asyncPostRequest(
+                client, URL, json=batchActivityQuery(github_id, chunk)
+            )
+            activity.update(parseActivityBatch(response.json(), chunk))
+        except Exception as e:
+            logging.error(
+                f"An unexpected error occurred for user at years {chunk}: {e}"
+            )
+    return activity
+
+
+# Async counterpart of fetchYearlyActivity
+async def asyncFetchYearlyActivity(client, github_id, years):
+    activity = {}
+    for year in years:
+        try:
+            response = await asyncPostRequest(
+                client, URL, json=activityQuery(github_id, year)
+            )
+            data = response.json()
+
+            if "errors" in data:
                 logging.error(
-                    f"An unexpected error occurred for user at year ({year}): {e}"
+                    f"GraphQL Error for user at year ({year}): {data['errors']}"
                 )
-                continue  # Skip to next year
+                continue
+
+            contributions = (
+                data.get("data", {}).get("node", {}).get("contributionsCollection")
+            )
+            activity[year] = parseContributions(contributions, year)
+
+        except Exception as e:
+            logging.error(
+                f"An unexpected error occurred for user at year ({year}): {e}"
+            )
+            continue
+    return activity
+
+
+# Upserts (user_id, year, stats) rows of one or many users with a single statement
+def batchUpsertUserActivity(rows, db, page_size=1000):
+    # A statement cannot update the same row twice, the last stats of a (user_id, year) win
+    latest = {(user_id, year): stats for user_id, year, stats in rows}
+    if not latest:
+        return
+    with db.cursor() as cur:
+        # Convert the dictionaries to JSON strings. This works for both JSON and JSONB columns.
+        execute_values(
+            cur,
+            """
+            INSERT INTO user_activity (user_id, year, activity_data)
+            VALUES %s
+            ON CONFLICT (user_id, year) DO UPDATE SET
+                activity_data = EXCLUDED.activity_data,
+                last_updated = NOW();
+            """,
+            [
+                (user_id, year, json.dumps(stats))
+                for (user_id, year), stats in latest.items()
+            ],
+            template="(%s, %s, %s::jsonb)",
+            page_size=page_size,
+        )
     db.commit()
-    cur.close()
-    end = int(time.time())
-    elapsed = end - start
-    logging.info(f"User Activity Data Collected: Elapsed {elapsed:.2f} seconds")
     return
 
 
@@ -165,21 +297,54 @@ def getTotalUserActivity(user_id, db):
     }
 
 
-def refreshActivityCheck(user_id, db):
+# Returns {user_id: [years]} of the activity years that are missing or stale for each
+# (user_id, created_at) pair. A year is refreshed when:
+#   - it has never been fetched,
+#   - it was last fetched before it ended (closed years are fetched once more, then frozen),
+#   - it is one of the ACTIVITY_OPEN_YEARS most recent years and older than ACTIVITY_REFRESH_DAYS.
+def planActivityRefresh(users, db):
+    if not users:
+        return {}
+    current_year = datetime.now().year
+    user_ids = [user_id for user_id, _ in users]
+    first_years = [activityYears(created_at).start for _, created_at in users]
+
     with db.cursor() as cur:
         cur.execute(
             """
-            SELECT
-                COALESCE(MAX(last_updated), 'epoch'::timestamp) < NOW() - INTERVAL '365 days'
-            FROM
-                user_activity
-            WHERE
-                user_id = %s;
+            SELECT u.user_id, y.year
+            FROM unnest(%s::bigint[], %s::int[]) AS u(user_id, first_year)
+            CROSS JOIN LATERAL generate_series(u.first_year, %s) AS y(year)
+            LEFT JOIN user_activity ua
+                ON ua.user_id = u.user_id AND ua.year = y.year
+            WHERE ua.user_id IS NULL
+                OR ua.last_updated IS NULL
+                OR ua.last_updated < make_timestamptz(y.year + 1, 1, 1, 0, 0, 0, 'UTC')
+                OR (
+                    y.year > %s - %s
+                    AND ua.last_updated < NOW() - make_interval(days => %s)
+                )
+            ORDER BY u.user_id, y.year;
             """,
-            (user_id,),
+            (
+                user_ids,
+                first_years,
+                current_year,
+                current_year,
+                ACTIVITY_OPEN_YEARS,
+                ACTIVITY_REFRESH_DAYS,
+            ),
         )
-        result = cur.fetchone()
-        print(result)
-        # The query returns a tuple with a single boolean value, e.g., (True,).
-        # We need to extract the boolean from the tuple.
-        return result[0] if result is not None else True
+        rows = cur.fetchall()
+
+    plan = {user_id: [] for user_id in user_ids}
+    for user_id, year in rows:
+        plan[user_id].append(year)
+    return plan
+
+
+# Years of a single user's activity that need to be (re)fetched, all of them for a new user
+def planActivityYears(user_id, created_at, db):
+    if user_id is None:
+        return list(activityYears(created_at))
+    return planActivityRefresh([(user_id, created_at)], db)[user_id]
@@ -4,18 +4,30 @@ import os
 
 # DB Query imports
 from backend.db.queries.queue import deleteFromQueue
+from backend.db.queries.bulk_load import BULK_LOAD_THRESHOLD, copyMerge
+from backend.db.queries.etag_cache import getEtag, saveEtag, deleteEtag
+from backend.db.queries.geocode_cache import (
+    GEOCODE_MISS,
+    getCachedCountry,
+    saveCachedCountry,
+)
 from backend.models.UserModel import UserModel
 
 # Functional Imports
-from backend.utils.github_api import getRequest, postRequest
-from openai import OpenAI
+from backend.utils.github_api import getRequest, postRequest, asyncPostRequest
+from backend.utils.http_session import getSession
+from backend.utils.gazetteer import getGazetteer
+from backend.utils.gender_inference import getGenderService
 from datetime import datetime, timezone
 import requests
 import json
+from psycopg2.extras import RealDictCursor, execute_values
 import re
+import time
+import threading
 
 # Scraper Imports
-from playwright.sync_api import sync_playwright
+from backend.utils.browser_pool import getBrowserPool
 
 # Logging Imports
 import logging
@@ -23,8 +35,14 @@ import logging
 # Load sensitive variables
 load_dotenv()
 EMAIL = os.getenv("email")
-API_KEY = os.getenv("API_KEY")
 URL = "https://api.github.com/graphql"
+USER_URL = "https://api.github.com/user/{}"
+# Returned by getGithubData when a conditional request reports the profile as unchanged (304)
+PROFILE_UNCHANGED = object()
+# Pronoun source: "graphql" reads the pronoun field of the profile through the API in bulk,
+# "browser" scrapes the profile page with the logged-in browser pool
+PRONOUN_PROVIDER = os.getenv("PRONOUN_PROVIDER", "graphql").lower()
+PRONOUN_BATCH_SIZE = 100
 
 
 # File for query logic that will be used/imported into the scraper
@@ -32,7 +50,16 @@ def createUser(github_id: int, db):
 
     user = getUserData(github_id, db)
     print(user)
+    if user is None:
+        return None, None
+
+    user_id = insertUser(user, db)
+    # Returns the user object and user id to the worker
+    return user, user_id
 
+
+# Inserts (or overwrites) the full row of a fetched user, returning its users.id
+def insertUser(user: UserModel, db):
     with db.cursor() as cur:
         cur.execute(
             """
@@ -80,7 +107,8 @@ def createUser(github_id: int, db):
                 email = EXCLUDED.email,
                 last_scraped = EXCLUDED.last_scraped,
                 is_enriched = EXCLUDED.is_enriched,
-                github_created_at = EXCLUDED.github_created_at;
+                github_created_at = EXCLUDED.github_created_at
+            RETURNING id;
             """,
             (
                 user.github_id,
@@ -106,20 +134,13 @@ def createUser(github_id: int, db):
                 user.github_created_at,
             ),
         )
-        # Get the user id
-        cur.execute(
-            """
-            SELECT id FROM users WHERE github_id = %s;
-            """,
-            (user.github_id,),
-        )
         user_id = cur.fetchone()[0]
 
+        saveEtag(USER_URL.format(user.github_id), user.etag, user.last_modified, db)
         db.commit()
         cur.close()
         logging.info(f"Created or updated user with GitHub ID: {user.github_id}")
-    # Returns the user object and user id to the worker
-    return user, user_id
+    return user_id
 
 
 # User already exists from previous sponsorship relation, run Github API request, collect and update user data
@@ -143,6 +164,19 @@ def enrichUser(github_id: int, db, enriched=False, identity=None):
         logging.info(f"No user data returned for {github_id}, skipping enrichment")
         return None
 
+    # Profile unchanged since the last scrape, the stored row is already up to date
+    if user.is_cached:
+        logging.info(f"Profile of {github_id} unchanged (304), skipping enrichment")
+        return user
+
+    updateUser(user, db)
+    # Returns the type of the user after getting metadata for scraping
+    return user
+
+
+# Writes the fetched data of an existing user, merging a stale row holding the same username
+# Returns the users.id of the updated row (which changes if a merge happened)
+def updateUser(user: UserModel, db):
     with db.cursor() as cur:
 
         cur.execute(
@@ -188,6 +222,7 @@ def enrichUser(github_id: int, db, enriched=False, identity=None):
                 is_enriched = %s,
                 github_created_at = %s
             WHERE github_id = %s
+            RETURNING id;
             """,
             (
                 user.github_id,
@@ -214,22 +249,41 @@ def enrichUser(github_id: int, db, enriched=False, identity=None):
                 user.github_id,
             ),
         )
+        user_id = cur.fetchone()[0]
+        saveEtag(USER_URL.format(user.github_id), user.etag, user.last_modified, db)
         db.commit()
         logging.info(f"Enriched user")
-    # Returns the type of the user after getting metadata for scraping
-    return user
+    return user_id
 
 
 # Batch create minimum users for sponsorship relations
+# Large batches are streamed in with COPY
 def batchCreateUser(github_ids, db):
 
     entries = [(github_id,) for github_id in github_ids]
+    if not entries:
+        return
+
+    if len(entries) > BULK_LOAD_THRESHOLD:
+        copyMerge(
+            "users_load",
+            "github_id bigint",
+            entries,
+            """
+            INSERT INTO users (github_id)
+            SELECT DISTINCT github_id FROM users_load
+            ON CONFLICT (github_id) DO NOTHING;
+            """,
+            db,
+        )
+        return
 
     with db.cursor() as cur:
-        cur.executemany(
+        execute_values(
+            cur,
             """
             INSERT INTO users (github_id)
-            VALUES (%s)
+            VALUES %s
             ON CONFLICT (github_id) DO NOTHING;
             """,
             entries,
@@ -241,64 +295,11 @@ def batchCreateUser(github_ids, db):
 
 def getUserData(github_id: int, db, is_enriched=False, identity=None):
     try:
-        data = getGithubData(github_id=github_id, db=db)
-        if not data:
-            return None
-
-        user = UserModel.from_api(data)
-
-        if user.location is not None:
-            user.location = getLocation(user.location)
-
-        # If user type is User
-        if user.type == "User":
-            # safe identity access (identity expected to be dict or None)
-            prev_has_pronouns = False
-            prev_gender = None
-            if isinstance(identity, dict):
-                prev_has_pronouns = bool(identity.get("pronouns", False))
-                prev_gender = identity.get("gender", None)
-
-            # Preset variables, if GitHub is not provided for scraping, function will skip pronouns
-            # and fall back on gpt-4o-mini query
-            has_pronouns = False
-            gender_data = None
-
-            # Conditionally scrape pronouns only if credentials are provided in the .env file
-            if os.getenv("gh_username") and os.getenv("gh_password"):
-                try:
-                    has_pronouns, gender_data = scrapePronouns(user.username)
-                except Exception as e:
-                    # Log the error but don't crash the whole process
-                    logging.error(f"Pronoun scraping failed for {user.username}: {e}")
-
-            user.has_pronouns = bool(has_pronouns)
-
-            if not is_enriched:
-                # initial enrichment: prefer explicit pronouns, else infer
-                if user.has_pronouns:
-                    user.gender = gender_data
-                else:
-                    user.gender = getGender(user.name, user.location)
-                user.is_enriched = True
-                return user
-
-            # This block handles re-enrichment of an existing user.
-            # If no new pronouns are found on the profile during the scrape:
-            if not user.has_pronouns:
-                # Preserve the previously stored gender and pronoun status.
-                user.gender = prev_gender
-                user.has_pronouns = prev_has_pronouns
-            else:
-                # If new pronouns are found, update the gender based on them.
-                user.gender = gender_data
-
-            user.is_enriched = True
+        user = fetchProfile(github_id, db, is_enriched)
+        # Unchanged profiles are loaded from the database and need no enrichment
+        if user is None or user.is_cached:
             return user
-
-        # Organization
-        user.is_enriched = True
-        return user
+        return enrichProfile(user, is_enriched, identity, db=db)
 
     except requests.exceptions.HTTPError as e:
         if getattr(e, "response", None) is not None and e.response.status_code == 404:
@@ -318,22 +319,97 @@ def getUserData(github_id: int, db, is_enriched=False, identity=None):
         return None
 
 
+# Fetches the REST profile of a user without the (slow) location, pronoun and gender enrichment
+def fetchProfile(github_id: int, db, is_enriched=False):
+    # Re-enrichment sends the stored ETag, an unchanged profile costs no rate limit
+    # and skips the location/gender lookups entirely
+    data = getGithubData(github_id=github_id, db=db, conditional=is_enriched)
+    if data is PROFILE_UNCHANGED:
+        return getStoredUser(github_id, db)
+    if not data:
+        return None
+    return UserModel.from_api(data)
+
+
+# Resolves the country, pronouns and gender of a freshly fetched profile
+# `db` is only used for the shared geocode cache
+def enrichProfile(
+    user: UserModel, is_enriched=False, identity=None, pronouns=None, db=None
+):
+    if user.location is not None:
+        user.location = getLocation(user.location, db)
+    return enrichIdentity(user, is_enriched, identity, pronouns)
+
+
+# Resolves the pronouns and gender of a profile (no database access)
+# `pronouns` is the GraphQL pronoun field when already fetched in bulk (None to look it up here)
+def enrichIdentity(user: UserModel, is_enriched=False, identity=None, pronouns=None):
+    # If user type is User
+    if user.type == "User":
+        # safe identity access (identity expected to be dict or None)
+        prev_has_pronouns = False
+        prev_gender = None
+        if isinstance(identity, dict):
+            prev_has_pronouns = bool(identity.get("pronouns", False))
+            prev_gender = identity.get("gender", None)
+
+        # If no pronouns are found, the function falls back on gpt-4o-mini query
+        has_pronouns, gender_data = lookupPronouns(user.username, pronouns)
+
+        user.has_pronouns = bool(has_pronouns)
+
+        if not is_enriched:
+            # initial enrichment: prefer explicit pronouns, else infer
+            if user.has_pronouns:
+                user.gender = gender_data
+            else:
+                user.gender = getGender(user.name, user.location)
+            user.is_enriched = True
+            return user
+
+        # This block handles re-enrichment of an existing user.
+        # If no new pronouns are found on the profile during the scrape:
+        if not user.has_pronouns:
+            # Preserve the previously stored gender and pronoun status.
+            user.gender = prev_gender
+            user.has_pronouns = prev_has_pronouns
+            # An inferred gender is only redone when the name or location it was based on changed
+            if (
+                isinstance(identity, dict)
+                and not prev_has_pronouns
+                and (
+                    identity.get("name") != user.name
+                    or identity.get("location") != user.location
+                )
+            ):
+                user.gender = getGender(user.name, user.location)
+        else:
+            # If new pronouns are found, update the gender based on them.
+            user.gender = gender_data
+
+        user.is_enriched = True
+        return user
+
+    # Organization
+    user.is_enriched = True
+    return user
+
+
 # Use GraphQL to query for users data based off their github ID
-def getGithubData(github_id: int, db):
+def getGithubData(github_id: int, db, conditional=False):
+    rest_url = USER_URL.format(github_id)
     try:
-        rest_url = f"https://api.github.com/user/{github_id}"
-        response = getRequest(url=rest_url)
+        etag, last_modified = getEtag(rest_url, db) if conditional else (None, None)
+        response = getRequest(url=rest_url, etag=etag, last_modified=last_modified)
+        if response.status_code == 304:
+            return PROFILE_UNCHANGED
         response.raise_for_status()
-        return response.json()
+        return readGithubData(response)
 
     # If user data does not exist in Github API, nuke from sponsorship database
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 404:
-            logging.error(
-                f" has changed usernames or no longer exists on github, Nuke user from DB."
-            )
-            deleteFromQueue(github_id, db)
-            deleteUser(github_id, db)
+            forgetUser(github_id, db)
             raise ValueError(f"User not found on GitHub.")
         else:
             logging.error(
@@ -342,6 +418,44 @@ def getGithubData(github_id: int, db):
     return None
 
 
+# Reads the profile of a successful user response along with its cache validators
+def readGithubData(response):
+    data = response.json()
+    data["etag"] = response.headers.get("ETag")
+    data["last_modified"] = response.headers.get("Last-Modified")
+    return data
+
+
+# Removes a user whose GitHub ID no longer resolves from the queue, the ETag cache and the users table
+def forgetUser(github_id: int, db):
+    logging.error(
+        f" has changed usernames or no longer exists on github, Nuke user from DB."
+    )
+    deleteFromQueue(github_id, db)
+    deleteEtag(USER_URL.format(github_id), db)
+    deleteUser(github_id, db)
+
+
+# Loads a previously enriched user from the database, used when GitHub reports the profile unchanged
+def getStoredUser(github_id: int, db):
+    with db.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            SELECT
+                github_id, username, name, type, has_pronouns, gender, location,
+                avatar_url, profile_url, company, following, followers, hireable,
+                bio, public_repos, public_gists, twitter_username, email,
+                private_sponsor_count, last_scraped, is_enriched, github_created_at
+            FROM users WHERE github_id = %s;
+            """,
+            (github_id,),
+        )
+        row = cur.fetchone()
+    if row is None:
+        return None
+    return UserModel.from_db(row)
+
+
 # Attempts to remove words that may confuse the location API to pull country of origin for user
 def clean_location(location):
     if not location or location.strip() == "":
@@ -390,54 +504,149 @@ def getLocationByImportance(locations):
 
 
 # Take the location of the github user, use openstreetmap API to pull the country of origin
-def getLocation(location):
+# Common locations are resolved offline by the gazetteer, then (with a connection) the shared
+# geocode cache is consulted, and only the remaining misses reach the API
+def getLocation(location, db=None):
     location = clean_location(location)
-    if location:
-        url = f"https://nominatim.openstreetmap.org/search?q={location}&format=json&addressdetails=1"
-        headers = {
-            "User-Agent": f"github-sponsor-dashboard/1.0 ({EMAIL})",
-            "Accept-Language": "en",
-        }
-        res = requests.get(url=url, headers=headers)
-        if res.status_code == 200:
-            data = res.json()
-            if data and "address" in data[0] and "country" in data[0]["address"]:
-                country = getLocationByImportance(data)
-                return country
-            else:
-                logging.warning(f"No location data found for '{location}'.")
-                return None
+    if not location:
+        return None
+
+    resolved, country = getGazetteer().resolve(location)
+    if resolved:
+        return country
+
+    if db is not None:
+        country = getCachedCountry(location, db)
+        if country is not GEOCODE_MISS:
+            return country
+
+    resolved, country = geocodeLocation(location)
+    # Failed requests are not cached, "no result" answers are (as a NULL country)
+    if db is not None and resolved:
+        saveCachedCountry(location, country, db)
+    return country
+
+
+# Nominatim allows about one request per second, shared by every thread of the process
+NOMINATIM_INTERVAL = 1.0
+_nominatim_lock = threading.Lock()
+_nominatim_last_call = 0.0
+
+
+# Sends a cleaned location to Nominatim, returns (resolved, country)
+# resolved is False when the request itself failed
+def geocodeLocation(location):
+    global _nominatim_last_call
+    with _nominatim_lock:
+        wait = _nominatim_last_call + NOMINATIM_INTERVAL - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        _nominatim_last_call = time.time()
+
+    url = f"https://nominatim.openstreetmap.org/search?q={location}&format=json&addressdetails=1"
+    headers = {
+        "User-Agent": f"github-sponsor-dashboard/1.0 ({EMAIL})",
+        "Accept-Language": "en",
+    }
+    res = getSession().get(url=url, headers=headers)
+    if res.status_code == 200:
+        data = res.json()
+        if data and "address" in data[0] and "country" in data[0]["address"]:
+            country = getLocationByImportance(data)
+            return True, country
         else:
-            logging.error(
-                f"OpenStreetMap.Org Request failed:", res.status_code, res.text
-            )
-            return None
-    return None
+            logging.warning(f"No location data found for '{location}'.")
+            return True, None
+    else:
+        logging.error(f"OpenStreetMap.Org Request failed: {res.status_code} {res.text}")
+        return False, None
 
 
 # Scrapes the pronouns of a passed in user
-def scrapePronouns(name):
-    with sync_playwright() as p:
+# Returns (has_pronouns, gender) of a user, from the GraphQL pronoun field when the provider is
+# "graphql" and the field is available, otherwise by scraping the profile page
+def lookupPronouns(username, pronouns=None):
+    if PRONOUN_PROVIDER == "graphql":
+        if pronouns is None:
+            pronouns = getPronounsBatch([username]).get(username)
+        if pronouns is not None:
+            return extract_pronouns(pronouns) if pronouns else (False, None)
+
+    # Conditionally scrape pronouns only if credentials are provided in the .env file
+    if os.getenv("gh_username") and os.getenv("gh_password"):
+        try:
+            return scrapePronouns(username)
+        except Exception as e:
+            # Log the error but don't crash the whole process
+            logging.error(f"Pronoun scraping failed for {username}: {e}")
+    return False, None
+
+
+# Dynamically build one query with an aliased user lookup for each username
+def pronounsQuery(usernames):
+    query_parts = [
+        f"u{index}: user(login: {json.dumps(username)}) {{ pronouns }}"
+        for index, username in enumerate(usernames)
+    ]
+    query_parts.append("rateLimit { cost remaining resetAt }")
+    return "query {" + " ".join(query_parts) + "}"
+
 
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+# Maps the aliased pronoun response back onto usernames ("" when a user has no pronouns set)
+# Users missing from the response (or a schema without the field) are left out
+def parsePronouns(usernames, data):
+    if "errors" in data:
+        logging.warning(f"GraphQL errors in pronoun batch: {data['errors']}")
 
-        url = f"https://github.com/{name}"
+    results = {}
+    nodes = data.get("data") or {}
+    for index, username in enumerate(usernames):
+        node = nodes.get(f"u{index}")
+        if node and "pronouns" in node:
+            results[username] = node["pronouns"] or ""
+    return results
 
-        context = browser.new_context(storage_state="auth.json")
-        page = context.new_page()
-        page.goto(url)
 
-        # content = page.content()
+# Fetches the pronoun field of many users, `batch_size` users per request
+def getPronounsBatch(usernames, batch_size=PRONOUN_BATCH_SIZE):
+    results = {}
+    for i in range(0, len(usernames), batch_size):
+        batch = usernames[i : i + batch_size]
+        try:
+            data = postRequest(url=URL, json={"query": pronounsQuery(batch)}).json()
+        except Exception as e:
+            logging.error(f"Failed to fetch pronoun batch. Error: {e}")
+            continue
+        results.update(parsePronouns(batch, data))
+    return results
+
+
+# Async counterpart of getPronounsBatch
+async def asyncGetPronounsBatch(client, usernames, batch_size=PRONOUN_BATCH_SIZE):
+    results = {}
+    for i in range(0, len(usernames), batch_size):
+        batch = usernames[i : i + batch_size]
+        try:
+            response = await asyncPostRequest(
+                client, URL, json={"query": pronounsQuery(batch)}
+            )
+            results.update(parsePronouns(batch, response.json()))
+        except Exception as e:
+            logging.error(f"Failed to fetch pronoun batch. Error: {e}")
+    return results
+
+
+def scrapePronouns(name):
+    def readPronouns(page):
+        # The pronoun span is server rendered, no need to wait for scripts or assets
+        page.goto(f"https://github.com/{name}", wait_until="domcontentloaded")
         pronoun_span = page.query_selector("span[itemprop='pronouns']")
         if pronoun_span:
             pronouns = pronoun_span.inner_text()
-            has_pronouns, gender = extract_pronouns(pronouns)
-        else:
-            has_pronouns, gender = False, None
+            return extract_pronouns(pronouns)
+        return False, None
 
-        browser.close()
-        return has_pronouns, gender
+    return getBrowserPool().run(readPronouns)
 
 
 # Extracts the pronouns out of the pronoun span (users may have random words and pronouns mixed)
@@ -474,32 +683,9 @@ def extract_pronouns(text):
 
 
 # Infer the gender of the username using the full name and current country (assuming place of origin for some users)
+# Memoized and batched with concurrent lookups by the shared gender service
 def getGender(name, country):
-    # Use gpt-4o-mini for gender inferencing
-    client = OpenAI(api_key=API_KEY)
-    user_message = f"full name: {name}"
-    if country is not None:
-        user_message += f", current location: {country}"
-
-    res = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                    Infer gender using fullname. Only output valid json in this format (Try not to output Unknown): { "gender": "Male" }, { "gender": "Female" }, or { "gender": "Unknown" }
-                """,
-            },
-            {
-                "role": "user",
-                "content": user_message,
-            },
-        ],
-    )
-    output = res.choices[0].message.content
-    user = json.loads(output)
-    gender = user["gender"]
-    return gender
+    return getGenderService().infer(name, country)
 
 
 # Runs a check if the user exists in the database an has already been visisted once
@@ -517,49 +703,35 @@ def findUser(github_id: int, db):
         "pronouns": None,
     }
 
+    # The identity fields are only used for enriched users, one row read covers both cases
     with db.cursor() as cur:
         cur.execute(
-            "SELECT id, is_enriched FROM users WHERE github_id = %s LIMIT 1;",
+            """
+            SELECT
+                id,
+                is_enriched,
+                gender,
+                has_pronouns,
+                name,
+                location
+            FROM users WHERE github_id = %s LIMIT 1;
+            """,
             (github_id,),
         )
-        r1 = cur.fetchone()
-        if r1:
-            identity["user_id"] = r1[0]
-            identity["is_enriched"] = bool(r1[1])
-            identity["user_exists"] = True
-
-            if identity["is_enriched"]:
-                cur.execute(
-                    """
-                    SELECT
-                        gender,
-                        has_pronouns
-                    FROM users WHERE github_id = %s LIMIT 1;
-                    """,
-                    (github_id,),
-                )
-                r2 = cur.fetchone()
-                if r2:
-                    identity["gender"] = r2[0]
-                    identity["pronouns"] = r2[1]
+        row = cur.fetchone()
+    if row:
+        identity["user_id"] = row[0]
+        identity["is_enriched"] = bool(row[1])
+        identity["user_exists"] = True
+
+        if identity["is_enriched"]:
+            identity["gender"] = row[2]
+            identity["pronouns"] = row[3]
+            identity["name"] = row[4]
+            identity["location"] = row[5]
     return identity
 
 
-# Returns an array of user id's mapped to the specific usernames
-def batchGetUserId(github_ids: list[int], db):
-    with db.cursor() as cur:
-        query = """
-            SELECT id, github_id 
-            FROM users 
-            WHERE github_id = ANY(%s)
-        """
-        cur.execute(query, (github_ids,))
-        rows = cur.fetchall()
-        # Convert to a dict or list as needed
-        return [user_id for user_id, _ in rows]
-    return
-
-
 # Deletes a specfic user from the DB
 def deleteUser(github_id: int, db):
     with db.cursor() as cur:
@@ -597,6 +769,35 @@ def finalizeUserScrape(github_id: int, private_count, min_sponsor_tier, db):
     return
 
 
+# Finalizes the scrape of many users with a single statement
+# entries: iterable of (github_id, private_count, min_sponsor_tier)
+def batchFinalizeUserScrape(entries, db):
+    scraped = datetime.now(timezone.utc)
+    entries = [
+        (github_id, private_count, min_sponsor_tier, scraped)
+        for github_id, private_count, min_sponsor_tier in entries
+    ]
+    if not entries:
+        return
+
+    with db.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            UPDATE users SET
+                last_scraped = v.last_scraped,
+                private_sponsor_count = v.private_count,
+                min_sponsor_cost = v.min_sponsor_cost
+            FROM (VALUES %s) AS v(github_id, private_count, min_sponsor_cost, last_scraped)
+            WHERE users.github_id = v.github_id;
+            """,
+            entries,
+            template="(%s::bigint, %s::bigint, %s::numeric, %s::timestamptz)",
+        )
+    db.commit()
+    return
+
+
 def getGithubIDs(usernames):
     """
     Gets the GitHub database IDs for a list of usernames by batching
@@ -0,0 +1,527 @@
+# DB Queries
+from backend.db.queries.queue import (
+    batchAddQueue,
+    batchRequeue,
+    enqueueStaleUsers,
+)
+from backend.db.queries.users import (
+    USER_URL,
+    readGithubData,
+    forgetUser,
+    getStoredUser,
+    enrichIdentity,
+    clean_location,
+    geocodeLocation,
+    findUser,
+    asyncGetPronounsBatch,
+    PRONOUN_PROVIDER,
+    PRONOUN_BATCH_SIZE,
+    batchCreateUser,
+)
+from backend.db.queries.sponsors import (
+    clearStagedSponsorships,
+    stageSponsorships,
+)
+from backend.db.queries.etag_cache import getEtag
+from backend.db.queries.geocode_cache import (
+    GEOCODE_MISS,
+    getCachedCountry,
+    saveCachedCountry,
+)
+from backend.db.queries.user_activity import (
+    asyncFetchUserActivity,
+    planActivityYears,
+)
+
+# Ingest/Scraper
+from backend.ingest.utils import (
+    async_get_sponsorships_entries,
+    async_complete_sponsorships,
+    async_iter_sponsorship_pages,
+    is_large_entry,
+    getSponsorableUsers,
+)
+from backend.ingest.worker import IngestWorker, CrawlJob, crawlWrites
+from backend.ingest.db_writer import DatabaseWriter
+from backend.utils.github_api import createAsyncClient, asyncGetRequest
+from backend.models.UserModel import UserModel
+from backend.utils.gazetteer import getGazetteer
+
+# Authentication And Database
+import psycopg2
+import httpx
+from backend.utils.db_conn import db_pool
+from backend.ingest.use_auth import get_auth, is_auth_expiring_soon
+from backend.utils.browser_pool import closeBrowserPools
+
+# Functional Imports
+import os
+import asyncio
+from dotenv import load_dotenv
+
+# Logging Imports
+import time
+import logging
+from backend.logs.logger_config import init_logger, log_header
+
+load_dotenv()
+
+# Number of users crawled at the same time, and number of DB connections shared between them
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 8))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))
+# Maximum number of users packed into one aliased sponsorship query
+SPONSOR_BATCH_SIZE = int(os.getenv("SPONSOR_BATCH_SIZE", 25))
+# Tasks per pipeline stage after the fetch stage (which uses CRAWL_CONCURRENCY), and the
+# number of users allowed to wait between two stages
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", 2))
+ACTIVITY_CONCURRENCY = int(os.getenv("ACTIVITY_CONCURRENCY", 4))
+PERSIST_CONCURRENCY = int(os.getenv("PERSIST_CONCURRENCY", 2))
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", 32))
+
+
+class DatabaseRunner:
+    """
+    Runs the blocking psycopg2 query functions off the event loop.
+
+    Every call borrows a connection from a bounded pool and executes in a worker thread,
+    so at most `size` queries are in flight no matter how many users are being crawled.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE):
+        self.pool = db_pool(1, size)
+        self.slots = asyncio.Semaphore(size)
+
+    async def run(self, fn, *args, **kwargs):
+        async with self.slots:
+            return await asyncio.to_thread(self._call, fn, args, kwargs)
+
+    def _call(self, fn, args, kwargs):
+        conn = self.pool.getconn()
+        try:
+            return fn(*args, db=conn, **kwargs)
+        except psycopg2.OperationalError:
+            # Drop the broken connection, the pool opens a fresh one on the next call
+            self.pool.putconn(conn, close=True)
+            conn = None
+            raise
+        finally:
+            if conn is not None:
+                if not conn.closed:
+                    conn.rollback()
+                self.pool.putconn(conn)
+
+    def close(self):
+        self.pool.closeall()
+
+
+class RequestBatcher:
+    """
+    Collects the lookups of concurrent crawlers into batched GraphQL queries.
+
+    Lookups are held for at most `wait` seconds (or until `batch_size` are pending) and then
+    resolved together by the `resolve(batch)` coroutine of the subclass, which returns a dict
+    of key -> result.
+    """
+
+    def __init__(self, client, batch_size, wait=0.05):
+        self.client = client
+        self.batch_size = batch_size
+        self.wait = wait
+        self.pending = []
+        self.flusher = None
+        # Running full-batch flushes, referenced until done so they are not garbage collected
+        self.flushes = set()
+
+    async def fetch(self, key, *args):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((key, args, future))
+
+        if len(self.pending) >= self.batch_size:
+            if self.flusher is not None:
+                self.flusher.cancel()
+                self.flusher = None
+            flush = asyncio.create_task(self._flush())
+            self.flushes.add(flush)
+            flush.add_done_callback(self.flushes.discard)
+        elif self.flusher is None:
+            self.flusher = asyncio.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.wait)
+        self.flusher = None
+        await self._flush()
+
+    async def _flush(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            results = await self.resolve([(key, args) for key, args, _ in batch])
+            for key, _, future in batch:
+                if not future.done():
+                    future.set_result(results.get(key))
+        except Exception as e:
+            # Hand the error back to every crawler waiting on this batch
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+class SponsorshipBatcher(RequestBatcher):
+    """
+    Resolves `fetch(github_id, user_type)` to the first sponsorship page of the user with
+    `async_get_sponsorships_entries`, None when the API returned nothing.
+    """
+
+    def __init__(self, client, batch_size=SPONSOR_BATCH_SIZE, wait=0.05):
+        super().__init__(client, batch_size, wait)
+
+    async def resolve(self, batch):
+        return await async_get_sponsorships_entries(
+            self.client,
+            [(github_id, user_type) for github_id, (user_type,) in batch],
+            self.batch_size,
+        )
+
+
+class PronounBatcher(RequestBatcher):
+    """Resolves `fetch(username)` with the GraphQL pronoun field, None when it is unavailable."""
+
+    def __init__(self, client, batch_size=PRONOUN_BATCH_SIZE, wait=0.05):
+        super().__init__(client, batch_size, wait)
+
+    async def resolve(self, batch):
+        return await asyncGetPronounsBatch(
+            self.client, [username for username, _ in batch], self.batch_size
+        )
+
+
+class AsyncIngestWorker(IngestWorker):
+    """
+    Concurrent, staged crawl mode of the `IngestWorker`.
+
+    A dispatcher pulls pending users from the queue and feeds them through a pipeline:
+    fetch (profile + sponsorships) -> enrich (location, pronouns, gender) -> activity -> persist.
+    Stages are connected by bounded queues and each runs its own number of tasks, so the slow
+    enrichment stage drains at its own pace while the fetch stage keeps the API budget busy, and
+    a full queue blocks the stage feeding it. Unchanged (cached) profiles skip enrichment.
+    """
+
+    def __init__(
+        self,
+        concurrency=CRAWL_CONCURRENCY,
+        db_pool_size=DB_POOL_SIZE,
+        worker_id=None,
+        seed_queue=True,
+        enrich_concurrency=ENRICH_CONCURRENCY,
+        activity_concurrency=ACTIVITY_CONCURRENCY,
+        persist_concurrency=PERSIST_CONCURRENCY,
+        stage_queue_size=STAGE_QUEUE_SIZE,
+    ):
+        super().__init__(worker_id, seed_queue)
+        self.concurrency = concurrency
+        self.db_pool_size = db_pool_size
+        self.stage_queue_size = stage_queue_size
+        self.in_flight: set[int] = set()
+        # Stage name -> (handler, number of tasks)
+        self.stages = {
+            "fetch": (self.fetchStage, concurrency),
+            "enrich": (self.enrichStage, enrich_concurrency),
+            "activity": (self.activityStage, activity_concurrency),
+            "persist": (self.persistStage, persist_concurrency),
+        }
+        # Users the dispatcher lets into the pipeline at once: every task busy and every queue full
+        self.capacity = sum(tasks for _, tasks in self.stages.values()) + (
+            len(self.stages) * stage_queue_size
+        )
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        init_logger()
+        self.db = DatabaseRunner(self.db_pool_size)
+        self.writer = DatabaseWriter()
+        log_header(f"Async Worker has Started ({self.concurrency} crawlers)")
+
+        self.queues = {
+            name: asyncio.Queue(maxsize=self.stage_queue_size) for name in self.stages
+        }
+        try:
+            async with createAsyncClient(
+                self.concurrency + self.stages["activity"][1]
+            ) as client:
+                self.client = client
+                self.sponsorships = SponsorshipBatcher(client)
+                self.pronouns = PronounBatcher(client)
+                tasks = [
+                    asyncio.create_task(self.stage(name))
+                    for name, (_, count) in self.stages.items()
+                    for _ in range(count)
+                ]
+                try:
+                    await self.dispatcher()
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    # Write the users still waiting for the DB writer, then hand the entries
+                    # this worker still holds back to the queue
+                    await asyncio.to_thread(self.writer.close)
+                    logging.info(f"DB writer: {self.writer.stats()}")
+                    await self.db.run(self.frontier.close)
+        finally:
+            self.db.close()
+            await asyncio.to_thread(closeBrowserPools)
+
+    # Feeds pending queue entries into the pipeline, running the periodic worker tasks in between
+    async def dispatcher(self):
+        last_stale_check = time.time()
+
+        while True:
+            init_run = await self.db.run(self.checkSeed)
+
+            if await asyncio.to_thread(is_auth_expiring_soon):
+                await asyncio.to_thread(get_auth)
+
+            # Re-scrape users every week (if they have not been re-visited)
+            if time.time() - last_stale_check >= 14400:
+                await self.db.run(enqueueStaleUsers, days_old=7)
+                last_stale_check = time.time()
+
+            try:
+                # Write back the statuses of finished users and refill the frontier when low
+                if self.frontier.needsRefill():
+                    await self.db.run(self.frontier.refill)
+                else:
+                    if self.frontier.hasWriteback():
+                        await self.db.run(self.frontier.flush)
+                    # Keeps the leases of queued and in flight users alive
+                    if self.frontier.renewDue():
+                        await self.db.run(self.frontier.renew)
+
+                # Top the pipeline up to its capacity
+                batch = []
+                while len(self.in_flight) + len(batch) < self.capacity:
+                    entry = self.frontier.pop()
+                    if entry is None:
+                        break
+                    batch.append(entry)
+            except psycopg2.OperationalError as e:
+                logging.warning(f"DB connection lost: {e}. Reconnecting...")
+                await asyncio.sleep(5)
+                continue
+
+            if not batch:
+                # Wait for in flight users to finish before deciding the queue is exhausted
+                if self.in_flight:
+                    await asyncio.sleep(1)
+                    continue
+                await self.db.run(getSponsorableUsers, init=init_run)
+                await self.db.run(batchRequeue)
+                continue
+
+            for entry in batch:
+                self.in_flight.add(entry["github_id"])
+                # Blocks while the fetch stage is backed up
+                await self.queues["fetch"].put(
+                    CrawlJob(github_id=entry["github_id"], priority=entry["priority"])
+                )
+
+    # One task of a pipeline stage: runs the stage handler and hands the job to the stage it names
+    async def stage(self, name):
+        handler, _ = self.stages[name]
+        inbox = self.queues[name]
+        while True:
+            job = await inbox.get()
+            github_id = job.github_id
+            try:
+                next_stage = await handler(job)
+                if next_stage is None:
+                    self.in_flight.discard(github_id)
+                else:
+                    await self.queues[next_stage].put(job)
+            except ValueError:
+                logging.warning(
+                    "User has been deleted. They do not exist on github (sponsors if previously existed have been updated)"
+                )
+                self.completeEntry(github_id, "skipped")
+                self.in_flight.discard(github_id)
+            except psycopg2.OperationalError as e:
+                logging.warning(
+                    f"DB connection lost while crawling {github_id} ({name}): {e}"
+                )
+                self.retryEntry(github_id)
+                self.in_flight.discard(github_id)
+            except Exception as e:
+                logging.error(
+                    f"Unhandled exception for Github ID {github_id} ({name}): {e}",
+                    exc_info=True,
+                )
+                self.retryEntry(github_id)
+                self.in_flight.discard(github_id)
+            finally:
+                inbox.task_done()
+
+    # Async counterpart of fetchProfile, the request goes through the shared client and a pooled
+    # connection is only taken for the ETag lookup and, on a 304, the stored profile
+    async def fetchProfile(self, github_id, is_enriched=False):
+        rest_url = USER_URL.format(github_id)
+        etag, last_modified = (
+            await self.db.run(getEtag, rest_url) if is_enriched else (None, None)
+        )
+        try:
+            response = await asyncGetRequest(self.client, rest_url, etag, last_modified)
+        except httpx.HTTPStatusError as e:
+            # If user data does not exist in Github API, nuke from sponsorship database
+            if e.response.status_code == 404:
+                await self.db.run(forgetUser, github_id)
+                raise ValueError(f"User not found on GitHub.")
+            logging.error(
+                f"An unexpected error occurred fetching user by ID {github_id}: {e}"
+            )
+            return None
+
+        if response.status_code == 304:
+            return await self.db.run(getStoredUser, github_id)
+        return UserModel.from_api(readGithubData(response))
+
+    # Fetch stage: identity, REST profile and sponsorships of the user
+    async def fetchStage(self, job):
+        log_header(f"SCRAPING CURRENT USER: Github ID {job.github_id} ")
+
+        job.identity = await self.db.run(findUser, github_id=job.github_id)
+        job.user_id = job.identity.get("user_id")
+        user_exists = bool(job.identity.get("user_exists", False))
+        is_enriched = user_exists and bool(job.identity.get("is_enriched", False))
+
+        job.user = await self.fetchProfile(job.github_id, is_enriched)
+        if job.user is None:
+            logging.warning(
+                f"No user data returned for Github ID {job.github_id}; skipping."
+            )
+            self.completeEntry(job.github_id, "skipped")
+            return None
+
+        if job.user.is_cached:
+            logging.info(
+                f"Profile of {job.github_id} unchanged (304), skipping enrichment"
+            )
+
+        sponsorships = self.sponsorships.fetch(job.github_id, job.user.type)
+        # Pronouns are read in bulk here so the enrich stage needs no browser visit
+        if (
+            not job.user.is_cached
+            and job.user.type == "User"
+            and PRONOUN_PROVIDER == "graphql"
+        ):
+            entry, job.pronouns = await asyncio.gather(
+                sponsorships, self.pronouns.fetch(job.user.username)
+            )
+        else:
+            entry = await sponsorships
+
+        # Empty lists would delete every stored edge, try the user again later instead
+        if entry is None:
+            logging.warning(
+                f"Sponsorships of Github ID {job.github_id} could not be fetched; retrying later."
+            )
+            self.retryEntry(job.github_id)
+            return None
+        job.sponsorships_fetched = True
+        if is_large_entry(entry):
+            # Accounts with very large sponsor lists are staged page by page, the persist
+            # stage applies the diff
+            job.min_sponsor_tier = entry["min_sponsor_tier"]
+            await self.streamSponsorships(job, entry)
+        else:
+            job.sponsors, job.sponsoring, job.private_count, job.min_sponsor_tier = (
+                await async_complete_sponsorships(
+                    self.client, job.github_id, job.user.type, entry
+                )
+            )
+            job.sponsor_count = len(job.sponsors)
+            job.sponsoring_count = len(job.sponsoring)
+        return "activity" if job.user.is_cached else "enrich"
+
+    # Async counterpart of stageSponsorshipPages, staging the pages of a large account as they arrive
+    async def streamSponsorships(self, job, entry):
+        await self.db.run(clearStagedSponsorships, job.github_id)
+        job.streamed = True
+        async for direction, github_ids, page_private in async_iter_sponsorship_pages(
+            self.client, job.github_id, job.user.type, entry
+        ):
+            job.private_count += page_private
+            if not github_ids:
+                continue
+            await self.db.run(batchCreateUser, github_ids)
+            await self.db.run(batchAddQueue, github_ids, priority=5)
+            await self.db.run(stageSponsorships, job.github_id, direction, github_ids)
+            # Staged count, the persist stage replaces it with the number of distinct edges
+            if direction == "sponsors":
+                job.sponsor_count += len(github_ids)
+            else:
+                job.sponsoring_count += len(github_ids)
+
+    # Enrich stage: location (through the geocode cache), pronoun and gender lookups
+    async def enrichStage(self, job):
+        is_enriched = bool(job.identity.get("user_exists", False)) and bool(
+            job.identity.get("is_enriched", False)
+        )
+        if job.user.location is not None:
+            job.user.location = await self.resolveLocation(job.user.location)
+        job.user = await asyncio.to_thread(
+            enrichIdentity, job.user, is_enriched, job.identity, job.pronouns
+        )
+        return "activity"
+
+    # Same lookup as `getLocation`, only holding a database connection for the cache queries
+    async def resolveLocation(self, location):
+        location = clean_location(location)
+        if not location:
+            return None
+
+        resolved, country = getGazetteer().resolve(location)
+        if resolved:
+            return country
+
+        country = await self.db.run(getCachedCountry, location)
+        if country is not GEOCODE_MISS:
+            return country
+
+        resolved, country = await asyncio.to_thread(geocodeLocation, location)
+        if resolved:
+            await self.db.run(saveCachedCountry, location, country)
+        return country
+
+    # Activity stage: missing or stale contribution years of users with sponsorship relations
+    async def activityStage(self, job):
+        if (
+            job.sponsor_count or job.sponsoring_count
+        ) and job.user.type != "Organization":
+            created_at = job.user.github_created_at
+            years = await self.db.run(planActivityYears, job.user_id, created_at)
+            if years:
+                job.activity = await asyncFetchUserActivity(
+                    self.client, job.github_id, created_at, years
+                )
+        return "persist"
+
+    # Persist stage: hands the user, its sponsorships and activity and the completed queue entry
+    # to the DB writer, which commits them together with other users in the background
+    async def persistStage(self, job):
+        loop = asyncio.get_running_loop()
+        # Blocks (off the event loop) while the writer is backed up
+        future = await asyncio.to_thread(
+            self.writer.submit, job.github_id, crawlWrites(job)
+        )
+        future.add_done_callback(
+            lambda future: loop.call_soon_threadsafe(self.writeDone, job, future)
+        )
+        return None
+
+
+if __name__ == "__main__":
+    worker = AsyncIngestWorker()
+    worker.run()
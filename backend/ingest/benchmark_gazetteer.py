@@ -0,0 +1,76 @@
+from backend.db.queries.users import clean_location
+from backend.utils.gazetteer import getGazetteer
+from backend.utils.db_conn import db_connection
+
+# Functional Imports
+import csv
+import sys
+import time
+from collections import Counter
+
+
+# Labeled sample of (location, country) pairs resolved by Nominatim, taken from the geocode cache
+def loadCacheSample(db, limit=None):
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            SELECT location, country
+            FROM geocode_cache
+            ORDER BY hits + misses DESC
+            LIMIT %s;
+            """,
+            (limit,),
+        )
+        return cur.fetchall()
+
+
+# Labeled sample from a csv file with `location,country` rows (empty country for no place)
+def loadCsvSample(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row[0], row[1] or None) for row in csv.reader(f) if row]
+
+
+def benchmark(sample):
+    """
+    Runs the gazetteer over a labeled sample and reports how many locations it resolves
+    (coverage), how many of those agree with the label (accuracy) and the time per lookup.
+    """
+    gazetteer = getGazetteer()
+    resolved = correct = 0
+    mismatches = Counter()
+
+    start = time.perf_counter()
+    results = [gazetteer.resolve(clean_location(location)) for location, _ in sample]
+    elapsed = time.perf_counter() - start
+
+    for (location, label), (is_resolved, country) in zip(sample, results):
+        if not is_resolved:
+            continue
+        resolved += 1
+        if country == label:
+            correct += 1
+        else:
+            mismatches[(location, label, country)] += 1
+
+    total = len(sample)
+    print(f"Sample size:  {total}")
+    print(f"Coverage:     {resolved}/{total} ({resolved / max(total, 1):.1%})")
+    print(f"Accuracy:     {correct}/{resolved} ({correct / max(resolved, 1):.1%})")
+    print(f"Per lookup:   {elapsed / max(total, 1) * 1e6:.1f} µs")
+    if mismatches:
+        print("Mismatches (location, label, gazetteer):")
+        for (location, label, country), _ in mismatches.most_common(25):
+            print(f"  {location!r}: {label!r} != {country!r}")
+
+
+# Usage: python -m backend.ingest.benchmark_gazetteer [sample.csv | limit]
+if __name__ == "__main__":
+    argument = sys.argv[1] if len(sys.argv) > 1 else None
+    if argument and not argument.isdigit():
+        benchmark(loadCsvSample(argument))
+    else:
+        conn = db_connection()
+        try:
+            benchmark(loadCacheSample(conn, int(argument) if argument else None))
+        finally:
+            conn.close()
@@ -0,0 +1,246 @@
+# DB Queries
+from backend.db.queries.queue import batchAddQueue, batchUpdateStatus
+from backend.db.queries.users import insertUser, updateUser, batchFinalizeUserScrape
+from backend.db.queries.sponsors import (
+    syncSponsors,
+    syncSponsorships,
+    syncStagedSponsorships,
+)
+from backend.db.queries.user_activity import batchUpsertUserActivity
+from backend.models.UserModel import UserModel
+
+# Database
+import psycopg2
+from backend.utils.db_conn import db_connection, UnitOfWork
+
+# Functional Imports
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Optional
+from dotenv import load_dotenv
+
+# Logging Imports
+import logging
+
+load_dotenv()
+
+# Crawled users written per transaction, seconds the writer waits for a group to fill up, and
+# crawled users allowed to wait for the writer before crawling blocks
+WRITER_GROUP_SIZE = int(os.getenv("WRITER_GROUP_SIZE", 20))
+WRITER_GROUP_WAIT = float(os.getenv("WRITER_GROUP_WAIT", 0.5))
+WRITER_QUEUE_SIZE = int(os.getenv("WRITER_QUEUE_SIZE", 100))
+
+
+@dataclass
+class UserUpsert:
+    """Profile of a crawled user, inserted when new and updated when it changed."""
+
+    user: UserModel
+    exists: bool
+
+
+@dataclass
+class EdgeDiff:
+    """Latest sponsorship edges of a user, read from the staging table when streamed."""
+
+    github_id: int
+    sponsors: list
+    sponsoring: list
+    streamed: bool = False
+
+
+@dataclass
+class ActivityRows:
+    """Collected {year: stats} activity, user_id is None for users inserted by the same group."""
+
+    github_id: int
+    user_id: Optional[int]
+    activity: dict
+
+
+@dataclass
+class QueueStatus:
+    """Final queue status and scrape summary of a crawled user."""
+
+    github_id: int
+    status: str
+    priority: Optional[int] = None
+    private_count: int = 0
+    min_sponsor_tier: Optional[int] = None
+
+
+# Applies the write intents of one or many users, with a single statement per intent type
+# wherever the queries allow it. Profiles go first so the rest can reference new users.
+def applyWrites(writes, db):
+    user_ids = {}
+    for write in writes:
+        if isinstance(write, UserUpsert):
+            if not write.exists:
+                user_ids[write.user.github_id] = insertUser(write.user, db)
+            elif not write.user.is_cached:
+                user_ids[write.user.github_id] = updateUser(write.user, db)
+
+    discovered = set()
+    for write in writes:
+        if isinstance(write, EdgeDiff):
+            if write.streamed:
+                syncStagedSponsorships(write.github_id, "sponsors", db)
+                syncStagedSponsorships(write.github_id, "sponsoring", db)
+            else:
+                syncSponsors(write.github_id, write.sponsors, db)
+                syncSponsorships(write.github_id, write.sponsoring, db)
+                discovered |= set(write.sponsors) | set(write.sponsoring)
+    # Users discovered by the group are queued at a middle standing priority
+    if discovered:
+        batchAddQueue(sorted(discovered), priority=5, db=db)
+
+    batchUpsertUserActivity(
+        [
+            (user_ids.get(write.github_id, write.user_id), year, stats)
+            for write in writes
+            if isinstance(write, ActivityRows)
+            for year, stats in write.activity.items()
+        ],
+        db,
+    )
+
+    statuses = [write for write in writes if isinstance(write, QueueStatus)]
+    batchFinalizeUserScrape(
+        [(s.github_id, s.private_count, s.min_sponsor_tier) for s in statuses], db
+    )
+    batchUpdateStatus([(s.github_id, s.status, s.priority) for s in statuses], db)
+    return
+
+
+class DatabaseWriter:
+    """
+    Background thread writing crawled users with group commits.
+
+    Crawlers `submit` the write intents of a user and move on. The writer takes up to
+    `group_size` users (those arriving within `wait` seconds of the first) and applies them in
+    one transaction on its own connection. The future returned by `submit` resolves once the
+    user is committed or holds its error; a failing group is retried user by user, so only the
+    users whose writes fail see an error. `submit` blocks while the queue is full.
+    """
+
+    def __init__(
+        self,
+        group_size=WRITER_GROUP_SIZE,
+        wait=WRITER_GROUP_WAIT,
+        queue_size=WRITER_QUEUE_SIZE,
+        connect=db_connection,
+    ):
+        self.group_size = group_size
+        self.wait = wait
+        self.connect = connect
+        self.conn = None
+        self.intents = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.groups = 0
+        self.written = 0
+        self.failed = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    # Queues the write intents of a crawled user, returns a future of its commit
+    def submit(self, github_id, writes):
+        future = Future()
+        self.intents.put((github_id, writes, future))
+        return future
+
+    # Writes everything submitted so far, then stops the writer
+    def close(self):
+        self.intents.put(None)
+        self.thread.join()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queue_depth": self.intents.qsize(),
+                "groups": self.groups,
+                "written": self.written,
+                "failed": self.failed,
+                "avg_flush_seconds": (
+                    self.flush_seconds / self.groups if self.groups else 0.0
+                ),
+                "max_flush_seconds": self.max_flush_seconds,
+            }
+
+    def _run(self):
+        closing = False
+        while not closing:
+            item = self.intents.get()
+            if item is None:
+                break
+            group = [item]
+            deadline = time.monotonic() + self.wait
+            while len(group) < self.group_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.intents.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                group.append(item)
+
+            start = time.monotonic()
+            self._flush(group)
+            self._record(len(group), time.monotonic() - start)
+
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+
+    def _flush(self, group):
+        try:
+            self._apply(group)
+        except Exception as e:
+            if len(group) == 1:
+                github_id, _, future = group[0]
+                logging.error(f"Failed to write Github ID {github_id}: {e}")
+                with self.lock:
+                    self.failed += 1
+                future.set_exception(e)
+                return
+            logging.warning(
+                f"Group commit of {len(group)} users failed ({e}), writing them one by one"
+            )
+            for item in group:
+                self._flush([item])
+            return
+
+        with self.lock:
+            self.written += len(group)
+        for _, _, future in group:
+            future.set_result(None)
+
+    def _apply(self, group):
+        if self.conn is None or self.conn.closed:
+            self.conn = self.connect()
+        try:
+            with UnitOfWork(self.conn) as uow:
+                applyWrites([write for _, writes, _ in group for write in writes], uow)
+        except psycopg2.OperationalError:
+            # Reconnect on the next group
+            self.conn.close()
+            self.conn = None
+            raise
+
+    def _record(self, size, seconds):
+        with self.lock:
+            self.groups += 1
+            self.flush_seconds += seconds
+            self.max_flush_seconds = max(self.max_flush_seconds, seconds)
+            groups = self.groups
+        logging.debug(f"DB writer flushed {size} users in {seconds:.3f} seconds")
+        if groups % 100 == 0:
+            logging.info(f"DB writer: {self.stats()}")
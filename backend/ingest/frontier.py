@@ -0,0 +1,156 @@
+from backend.db.queries.queue import (
+    LEASE_SECONDS,
+    claimQueueBatch,
+    batchUpdateStatus,
+    reclaimExpiredLeases,
+    renewLeases,
+    releaseLeases,
+    retryEntries,
+)
+
+# Functional Imports
+import os
+import time
+import heapq
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Entries held in memory per worker, and the size below which the frontier is refilled
+FRONTIER_SIZE = int(os.getenv("FRONTIER_SIZE", 100))
+FRONTIER_LOW_WATERMARK = int(os.getenv("FRONTIER_LOW_WATERMARK", 20))
+# Status updates buffered before they are written back to the queue table
+QUEUE_BATCH_SIZE = int(os.getenv("QUEUE_BATCH_SIZE", 10))
+
+
+class Frontier:
+    """
+    In-memory, heap-ordered view of the queue entries leased to one worker.
+
+    Entries are claimed from the `queue` table in chunks and ordered locally by
+    (priority, created_at, github_id), so taking the next user is an O(log n) heap pop and the
+    database only sees bulk refills. Final statuses are buffered and written back in batches.
+    Leases are renewed for queued entries and for popped entries still being crawled.
+
+    Write results are reported from the DB writer thread while the crawl loop pops, renews and
+    flushes, so the in-memory state is guarded by a lock that is never held across a query.
+    """
+
+    def __init__(
+        self,
+        worker_id,
+        size=FRONTIER_SIZE,
+        low_watermark=FRONTIER_LOW_WATERMARK,
+        writeback_size=QUEUE_BATCH_SIZE,
+        lease_seconds=LEASE_SECONDS,
+    ):
+        self.worker_id = worker_id
+        self.size = size
+        self.low_watermark = low_watermark
+        self.writeback_size = writeback_size
+        self.lease_seconds = lease_seconds
+        self.lock = threading.Lock()
+        self.heap = []
+        # Popped entries not written, completed or retried yet, their leases are renewed with the heap's
+        self.in_flight = set()
+        self.renewed_at = time.monotonic()
+        self.completions = []
+        # Entries whose crawl failed, handed back to the queue with their next flush
+        self.retries = []
+        # Set when the last refill got fewer entries than asked for, avoids polling an empty queue
+        self.exhausted = False
+
+    def __len__(self):
+        return len(self.heap)
+
+    def needsRefill(self):
+        if not self.heap:
+            return True
+        return len(self.heap) < self.low_watermark and not self.exhausted
+
+    # Writes back finished entries, keeps held leases alive and claims entries up to `size`
+    def refill(self, db):
+        self.flush(db)
+        reclaimExpiredLeases(db)
+        self.renew(db)
+
+        wanted = self.size - len(self.heap)
+        entries = claimQueueBatch(db, worker_id=self.worker_id, limit=wanted)
+        with self.lock:
+            for entry in entries:
+                heapq.heappush(
+                    self.heap,
+                    (entry["priority"], entry["created_at"], entry["github_id"]),
+                )
+        self.exhausted = len(entries) < wanted
+        return len(entries)
+
+    # Returns the highest-priority entry, or None if the frontier is empty
+    def pop(self):
+        with self.lock:
+            if not self.heap:
+                return None
+            priority, _, github_id = heapq.heappop(self.heap)
+            self.in_flight.add(github_id)
+        return {"github_id": github_id, "priority": priority}
+
+    def complete(self, github_id, status, priority=None):
+        with self.lock:
+            self.in_flight.discard(github_id)
+            self.completions.append((github_id, status, priority))
+
+    def retry(self, github_id):
+        with self.lock:
+            self.in_flight.discard(github_id)
+            self.retries.append(github_id)
+
+    # Stops tracking an entry whose final status was committed with its writes by the DB writer
+    def written(self, github_id):
+        with self.lock:
+            self.in_flight.discard(github_id)
+
+    # Ids of every entry this worker holds a lease on, queued or being crawled
+    def held(self):
+        with self.lock:
+            return [entry[2] for entry in self.heap] + list(self.in_flight)
+
+    # True once half the lease has passed since the last renewal
+    def renewDue(self):
+        return time.monotonic() - self.renewed_at >= self.lease_seconds / 2
+
+    # Extends the leases of every entry this worker holds, queued or being crawled
+    def renew(self, db):
+        held = self.held()
+        if held:
+            renewLeases(held, self.worker_id, db)
+        self.renewed_at = time.monotonic()
+
+    def hasWriteback(self):
+        return bool(self.completions or self.retries)
+
+    def shouldFlush(self):
+        return len(self.completions) + len(self.retries) >= self.writeback_size
+
+    def flush(self, db):
+        with self.lock:
+            completions, retries = list(self.completions), list(self.retries)
+        if completions:
+            batchUpdateStatus(completions, db)
+            # Crawlers may have appended while writing, only drop what was written
+            with self.lock:
+                del self.completions[: len(completions)]
+        if retries:
+            retryEntries(retries, self.worker_id, db)
+            with self.lock:
+                del self.retries[: len(retries)]
+
+    # Writes back buffered statuses and hands unprocessed (or abandoned) entries back to the queue
+    def close(self, db):
+        self.flush(db)
+        held = self.held()
+        if held:
+            releaseLeases(held, self.worker_id, db)
+            with self.lock:
+                self.heap = []
+                self.in_flight.difference_update(held)
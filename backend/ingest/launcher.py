@@ -0,0 +1,95 @@
+from backend.ingest.worker import IngestWorker, seedQueue, defaultWorkerId
+from backend.ingest.async_worker import AsyncIngestWorker
+
+# Database
+import psycopg2
+from backend.utils.db_conn import db_connection
+
+# Functional Imports
+import os
+import time
+import multiprocessing
+from dotenv import load_dotenv
+
+# Logging Imports
+import logging
+from backend.logs.logger_config import init_logger, log_header
+
+load_dotenv()
+
+# Number of worker processes sharing the queue, and whether they run the concurrent crawl mode
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 2))
+WORKER_ASYNC = os.getenv("WORKER_ASYNC", "false").lower() == "true"
+# Seconds between two checks of whether the queue is due for a (re)seed
+SEED_CHECK_SECONDS = 3600
+
+
+# Entry point of a single worker process, the launcher seeds the queue in its place
+def startWorker(index, use_async):
+    worker_id = f"{defaultWorkerId()}-{index}"
+    if use_async:
+        AsyncIngestWorker(worker_id=worker_id, seed_queue=False).run()
+    else:
+        IngestWorker(worker_id=worker_id, seed_queue=False).run()
+
+
+# Seeds the queue for the whole fleet when a (re)seed is due
+def seedFleet():
+    conn = db_connection()
+    try:
+        seedQueue(conn)
+    finally:
+        conn.close()
+
+
+def spawnWorker(index, use_async):
+    process = multiprocessing.Process(
+        target=startWorker, args=(index, use_async), name=f"ingest-worker-{index}"
+    )
+    process.start()
+    logging.info(f"Started {process.name} (pid {process.pid})")
+    return process
+
+
+def launch(processes=WORKER_PROCESSES, use_async=WORKER_ASYNC):
+    """
+    Runs a fleet of `IngestWorker` processes against the same queue.
+
+    Workers claim queue entries with `FOR UPDATE SKIP LOCKED` leases, so no user is crawled twice.
+    Only the launcher seeds the queue: before the fleet starts, then whenever a re-seed is due
+    (checked every `SEED_CHECK_SECONDS`). Any worker process that exits is restarted. Entries
+    leased by a crashed worker are reclaimed by the fleet once their lease expires.
+    """
+    init_logger()
+    log_header(f"Launching {processes} Ingest Workers")
+
+    seedFleet()
+    last_seed_check = time.time()
+
+    fleet = [spawnWorker(index, use_async) for index in range(processes)]
+    try:
+        while True:
+            time.sleep(10)
+            if time.time() - last_seed_check >= SEED_CHECK_SECONDS:
+                try:
+                    seedFleet()
+                except psycopg2.Error as e:
+                    logging.warning(f"Could not seed the queue: {e}")
+                last_seed_check = time.time()
+            for index, process in enumerate(fleet):
+                if not process.is_alive():
+                    logging.warning(
+                        f"{process.name} exited with code {process.exitcode}. Restarting."
+                    )
+                    fleet[index] = spawnWorker(index, use_async)
+    except KeyboardInterrupt:
+        logging.info("Stopping worker fleet.")
+    finally:
+        for process in fleet:
+            process.terminate()
+        for process in fleet:
+            process.join()
+
+
+if __name__ == "__main__":
+    launch()
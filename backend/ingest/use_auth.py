@@ -1,4 +1,5 @@
 from playwright.sync_api import sync_playwright
+from backend.utils.browser_pool import AUTH_PATH, getBrowserPool
 import os
 import time
 import json
@@ -10,9 +11,6 @@ load_dotenv()
 USERNAME = os.getenv("gh_username")
 PASSWORD = os.getenv("gh_password")
 
-# File pathname of authentication file
-AUTH_PATH = "auth.json"
-
 
 # Checks if the auth file exists, returns True (expiring soon), or time remaining
 def is_auth_expiring_soon(auth_path=AUTH_PATH):
@@ -43,15 +41,14 @@ def is_auth_expiring_soon(auth_path=AUTH_PATH):
 def check_auth(auth_path=AUTH_PATH):
     if not os.path.exists(auth_path):
         return False
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(storage_state=auth_path)
-        page = context.new_page()
+
+    def loggedIn(page):
         page.goto("https://github.com")
         # Check for a logged-in element
-        logged_in = page.locator("text=Sign out").is_visible()
-        browser.close()
-        return logged_in
+        return page.locator("text=Sign out").is_visible()
+
+    # Reuses the pooled browser, the full page (scripts included) is needed here
+    return getBrowserPool(auth_path).run(loggedIn, block_resources=False)
 
 
 # Headlessy logs into github using venv account details
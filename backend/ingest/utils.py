@@ -1,9 +1,10 @@
+import os
 import time
 import logging
 import base64
 from datetime import timedelta, datetime
 from dotenv import load_dotenv
-from backend.utils.github_api import postRequest
+from backend.utils.github_api import postRequest, asyncPostRequest
 
 # Scraping Import
 from playwright.sync_api import sync_playwright
@@ -11,6 +12,7 @@ from playwright.sync_api import sync_playwright
 # Query Import
 from backend.db.queries.users import getGithubIDs
 from backend.db.queries.queue import batchAddQueue
+from backend.db.queries.bulk_load import BULK_LOAD_THRESHOLD
 
 
 load_dotenv()
@@ -18,52 +20,165 @@ load_dotenv()
 # Globals
 URL = "https://api.github.com/graphql"
 SPONSORS_URL = "https://github.com/sponsors/explore"
+# Accounts with more edges than this in a direction are streamed page by page into the
+# staging table instead of being collected in memory
+SPONSOR_STREAM_THRESHOLD = int(os.getenv("SPONSOR_STREAM_THRESHOLD", 1000))
 
 
-# Parent function to handle both functions running
-# Return a list of sponsors, sponsored users, and a count of private sponsors
+# Parent function fetching both sponsorship directions of a user in a single round trip
+# Return a list of sponsors, sponsored users, a count of private sponsors and the lowest tier cost
 def get_sponsorships(username, github_id: int, user_type):
     logging.info(f"Starting Sponsorship Fetch via API for {user_type} '{username}'")
+    start_time = time.time()
 
-    sponsor_list, private_count, lowest_tier_cost = get_sponsors_from_api(
-        github_id,
-        user_type,
-    )
-    sponsored_list = get_sponsored_from_api(
-        github_id,
-        user_type,
-    )
-    return sponsor_list, sponsored_list, private_count, lowest_tier_cost
+    entry = get_sponsorships_entry(github_id, user_type)
+    if entry is None:
+        return [], [], 0, 0
 
+    sponsorships = complete_sponsorships(github_id, user_type, entry)
+    end_time = time.time()
+    logging.info(f"API fetch completed in {end_time - start_time:.2f} seconds.")
+    return sponsorships
+
+
+# Fetches the first page of both sponsorship directions of a user
+# Returns the parsed entry, or None if the request failed or the API returned no user
+def get_sponsorships_entry(github_id: int, user_type):
+    variables = {"nodeId": get_node_id(github_id, user_type)}
+    query = {"query": SPONSORSHIPS_QUERY, "variables": variables}
+    try:
+        data = postRequest(url=URL, json=query).json()
+    except Exception as e:
+        logging.error(f"Failed to fetch sponsorships for ID '{github_id}'. Error: {e}")
+        return None
+
+    entity_data = parse_sponsorships_node(github_id, data)
+    if entity_data is None:
+        return None
+    return parse_sponsorships_entry(entity_data)
+
+
+# Async counterpart of get_sponsorships_entry
+async def async_get_sponsorships_entry(client, github_id: int, user_type):
+    variables = {"nodeId": get_node_id(github_id, user_type)}
+    query = {"query": SPONSORSHIPS_QUERY, "variables": variables}
+    try:
+        response = await asyncPostRequest(client, URL, json=query)
+        data = response.json()
+    except Exception as e:
+        logging.error(f"Failed to fetch sponsorships for ID '{github_id}'. Error: {e}")
+        return None
+
+    entity_data = parse_sponsorships_node(github_id, data)
+    if entity_data is None:
+        return None
+    return parse_sponsorships_entry(entity_data)
+
+
+# Returns the node of a combined sponsorship response, or None if the API returned errors/no user
+def parse_sponsorships_node(github_id, data):
+    if "errors" in data:
+        logging.error(f"GraphQL errors: {data['errors']}")
+        return None
+    entity_data = (data.get("data") or {}).get("node")
+    if not entity_data:
+        logging.warning(f"Could not find entity with the provided ID {github_id}.")
+        return None
+    return entity_data
+
+
+# Pages through the remaining sponsors/sponsoring of a parsed first page, only for connections with more pages
+def complete_sponsorships(github_id, user_type, entry):
+    sponsors, sponsoring = entry["sponsors"], entry["sponsoring"]
+    private_count = entry["private_count"]
+    if entry["sponsors_cursor"]:
+        more_sponsors, more_private, _ = get_sponsors_from_api(
+            github_id, user_type, cursor=entry["sponsors_cursor"]
+        )
+        sponsors += more_sponsors
+        private_count += more_private
+    if entry["sponsoring_cursor"]:
+        sponsoring += get_sponsored_from_api(
+            github_id, user_type, cursor=entry["sponsoring_cursor"]
+        )
+    return sponsors, sponsoring, private_count, entry["min_sponsor_tier"]
 
-# Returns the sponsors that are associated to the passed in user
-def get_sponsors_from_api(github_id, user_type):
-    """
-    Fetches all sponsors for a given user or organization using the GitHub GraphQL API.
-        :param username: The login name of the user or organization.
-        :param user_type: The type of account, either 'user' or 'organization'.
 
-    If a user does not have a minimum monthly tier, the database will set that value to 0.
-    Their monthly income estimate will be derived from the median monthly sponsor cost.
-    """
+# Async counterpart of complete_sponsorships
+async def async_complete_sponsorships(client, github_id, user_type, entry):
+    sponsors, sponsoring = entry["sponsors"], entry["sponsoring"]
+    private_count = entry["private_count"]
+    if entry["sponsors_cursor"]:
+        more_sponsors, more_private, _ = await async_get_sponsors_from_api(
+            client, github_id, user_type, cursor=entry["sponsors_cursor"]
+        )
+        sponsors += more_sponsors
+        private_count += more_private
+    if entry["sponsoring_cursor"]:
+        sponsoring += await async_get_sponsored_from_api(
+            client, github_id, user_type, cursor=entry["sponsoring_cursor"]
+        )
+    return sponsors, sponsoring, private_count, entry["min_sponsor_tier"]
+
+
+# True when a parsed first page reports more edges in a direction than should be held in memory
+def is_large_entry(entry):
+    return (
+        entry["sponsors_total"] > SPONSOR_STREAM_THRESHOLD
+        or entry["sponsoring_total"] > SPONSOR_STREAM_THRESHOLD
+    )
+
+
+# Yields every page of a parsed first page and the pages after it as (direction, github_ids, private_count),
+# direction being "sponsors" or "sponsoring". Only one page is held in memory at a time.
+def iter_sponsorship_pages(github_id, user_type, entry):
+    yield "sponsors", entry["sponsors"], entry["private_count"]
+    if entry["sponsors_cursor"]:
+        for sponsor_ids, private_count, _ in iter_sponsor_pages(
+            github_id, user_type, cursor=entry["sponsors_cursor"]
+        ):
+            yield "sponsors", sponsor_ids, private_count
+    yield "sponsoring", entry["sponsoring"], 0
+    if entry["sponsoring_cursor"]:
+        for sponsored_ids in iter_sponsored_pages(
+            github_id, user_type, cursor=entry["sponsoring_cursor"]
+        ):
+            yield "sponsoring", sponsored_ids, 0
+
+
+# Async counterpart of iter_sponsorship_pages
+async def async_iter_sponsorship_pages(client, github_id, user_type, entry):
+    yield "sponsors", entry["sponsors"], entry["private_count"]
+    if entry["sponsors_cursor"]:
+        async for sponsor_ids, private_count, _ in async_iter_sponsor_pages(
+            client, github_id, user_type, cursor=entry["sponsors_cursor"]
+        ):
+            yield "sponsors", sponsor_ids, private_count
+    yield "sponsoring", entry["sponsoring"], 0
+    if entry["sponsoring_cursor"]:
+        async for sponsored_ids in async_iter_sponsored_pages(
+            client, github_id, user_type, cursor=entry["sponsoring_cursor"]
+        ):
+            yield "sponsoring", sponsored_ids, 0
+
+
+# Builds the base64 GraphQL node id of a user or organization from its database id
+def get_node_id(github_id, user_type):
     if user_type.lower() not in ["user", "organization"]:
         raise ValueError("user_type must be 'user' or 'organization'")
 
+    # The prefix for a User ID is '04:' and for an Organization ID is '12:'.
+    # This is not officially documented but is the current standard.
     prefix = "04:" if user_type.lower() == "user" else "12:"
-    node_id = base64.b64encode(
+    return base64.b64encode(
         f"{prefix}{user_type.title()}{github_id}".encode("utf-8")
     ).decode("utf-8")
 
-    sponsors_list: list[int] = []
-    private_sponsors_count = 0
-    lowest_tier_cost = 0
-    has_next_page = True
-    cursor = None
-    response = None
 
-    # Dynamic query template for the Github GraphQL API
+# Dynamic query template for the Github GraphQL API
+def sponsors_query(user_type):
     # snippet-start: GraphQL-Sponsor-Query
-    query_template = f"""
+    return f"""
     query($nodeId: ID!, $cursor: String) {{
       node(id: $nodeId) {{
         ... on {user_type.title()} {{
@@ -95,9 +210,226 @@ def get_sponsors_from_api(github_id, user_type):
     """
     # snippet-end
 
+
+# Dynamic query template for the Github GraphQL API
+def sponsoring_query(user_type):
+    return f"""
+    query($nodeId: ID!, $cursor: String) {{
+      node(id: $nodeId) {{
+        ... on {user_type.title()} {{
+          sponsorshipsAsSponsor(first: 100, after: $cursor) {{
+            totalCount
+            pageInfo {{
+              endCursor
+              hasNextPage
+            }}
+            nodes {{
+              sponsorable {{
+                ... on User {{ databaseId }}
+                ... on Organization {{ databaseId }}
+              }}
+            }}
+          }}
+        }}
+      }}
+    }}
+    """
+
+
+# Returns the lowest monthly (non one-time) tier of a sponsors listing in dollars, 0 if none exist
+def parse_lowest_tier(sponsors_listing):
+    if not sponsors_listing or not sponsors_listing.get("tiers"):
+        return 0
+    tiers = sponsors_listing["tiers"]["nodes"]
+    monthly_prices_in_cents = [
+        tier["monthlyPriceInCents"]
+        for tier in tiers
+        if not tier.get("isOneTime") and "monthlyPriceInCents" in tier
+    ]
+    if not monthly_prices_in_cents:
+        return 0
+    lowest_tier_cost = min(monthly_prices_in_cents) / 100
+    logging.info(f"Lowest monthly tier: ${lowest_tier_cost:.2f}")
+    return lowest_tier_cost
+
+
+# Splits one page of sponsorshipsAsMaintainer nodes into public sponsor ids and a private count
+def parse_sponsor_nodes(nodes):
+    sponsor_ids = []
+    private_count = 0
+    for node in nodes or []:
+        if not node:
+            continue
+        if node.get("privacyLevel") == "PRIVATE":
+            private_count += 1
+        elif node.get("sponsorEntity") and node["sponsorEntity"].get("databaseId"):
+            sponsor_ids.append(node["sponsorEntity"]["databaseId"])
+    return sponsor_ids, private_count
+
+
+# Collects the sponsored ids of one page of sponsorshipsAsSponsor nodes
+def parse_sponsoring_nodes(nodes):
+    return [
+        node["sponsorable"]["databaseId"]
+        for node in nodes or []
+        if node and node.get("sponsorable") and node["sponsorable"].get("databaseId")
+    ]
+
+
+# Fields fetched for every user of a sponsorship query, first page of both directions
+SPONSORSHIP_FIELDS = """
+fragment SponsorshipFields on Sponsorable {
+  sponsorshipsAsMaintainer(first: 100, includePrivate: true) {
+    totalCount
+    pageInfo { endCursor hasNextPage }
+    nodes {
+      privacyLevel
+      sponsorEntity {
+        ... on User { databaseId }
+        ... on Organization { databaseId }
+      }
+    }
+  }
+  sponsorshipsAsSponsor(first: 100) {
+    totalCount
+    pageInfo { endCursor hasNextPage }
+    nodes {
+      sponsorable {
+        ... on User { databaseId }
+        ... on Organization { databaseId }
+      }
+    }
+  }
+  sponsorsListing {
+    tiers(first: 20) {
+      nodes {
+        monthlyPriceInCents
+        isOneTime
+      }
+    }
+  }
+}
+"""
+
+# Single user version of the batched query, both directions and the listing tiers in one document
+SPONSORSHIPS_QUERY = (
+    "query($nodeId: ID!) { rateLimit { cost remaining resetAt } "
+    "node(id: $nodeId) { ...SponsorshipFields } }" + SPONSORSHIP_FIELDS
+)
+
+
+# Dynamically build one query with an aliased node lookup for each (github_id, user_type)
+def batch_sponsorships_query(users):
+    query_parts = [
+        f'u{index}: node(id: "{get_node_id(github_id, user_type)}") {{ ...SponsorshipFields }}'
+        for index, (github_id, user_type) in enumerate(users)
+    ]
+    query_parts.append("rateLimit { cost remaining resetAt }")
+    return "query {" + " ".join(query_parts) + "}" + SPONSORSHIP_FIELDS
+
+
+# Parses the first page of a user's sponsorships, keeping the cursors of connections that have more pages
+def parse_sponsorships_entry(entity_data):
+    sponsorships = entity_data.get("sponsorshipsAsMaintainer") or {}
+    sponsored = entity_data.get("sponsorshipsAsSponsor") or {}
+    sponsors_page = sponsorships.get("pageInfo", {})
+    sponsoring_page = sponsored.get("pageInfo", {})
+
+    sponsor_ids, private_count = parse_sponsor_nodes(sponsorships.get("nodes", []))
+    return {
+        "sponsors": sponsor_ids,
+        "sponsoring": parse_sponsoring_nodes(sponsored.get("nodes", [])),
+        "private_count": private_count,
+        "min_sponsor_tier": parse_lowest_tier(entity_data.get("sponsorsListing")),
+        "sponsors_total": sponsorships.get("totalCount", 0),
+        "sponsoring_total": sponsored.get("totalCount", 0),
+        "sponsors_cursor": (
+            sponsors_page.get("endCursor") if sponsors_page.get("hasNextPage") else None
+        ),
+        "sponsoring_cursor": (
+            sponsoring_page.get("endCursor")
+            if sponsoring_page.get("hasNextPage")
+            else None
+        ),
+    }
+
+
+# Maps the aliased response of a batched sponsorship query back onto github_ids
+def parse_sponsorships_batch(users, data):
+    if "errors" in data:
+        # Errors are reported per alias, the remaining aliases still hold valid data
+        logging.warning(f"GraphQL errors in sponsorship batch: {data['errors']}")
+
+    results = {}
+    nodes = data.get("data") or {}
+    for index, (github_id, _) in enumerate(users):
+        entity_data = nodes.get(f"u{index}")
+        if entity_data:
+            results[github_id] = parse_sponsorships_entry(entity_data)
+    return results
+
+
+# Fetches the parsed first page of many users with aliased queries, without paginating further
+# Users missing from a batch response are fetched on their own, None if that fails as well
+async def async_get_sponsorships_entries(client, users, batch_size=25):
+    results = {}
+    for i in range(0, len(users), batch_size):
+        batch = users[i : i + batch_size]
+        payload = {"query": batch_sponsorships_query(batch)}
+        try:
+            response = await asyncPostRequest(client, URL, json=payload)
+            entries = parse_sponsorships_batch(batch, response.json())
+        except Exception as e:
+            logging.error(f"Failed to fetch sponsorship batch. Error: {e}")
+            entries = {}
+
+        for github_id, user_type in batch:
+            entry = entries.get(github_id)
+            if entry is None:
+                entry = await async_get_sponsorships_entry(client, github_id, user_type)
+            results[github_id] = entry
+    return results
+
+
+# Returns the sponsors that are associated to the passed in user
+def get_sponsors_from_api(github_id, user_type, cursor=None):
+    """
+    Fetches all sponsors for a given user or organization using the GitHub GraphQL API.
+        :param username: The login name of the user or organization.
+        :param user_type: The type of account, either 'user' or 'organization'.
+        :param cursor: Optional page cursor to resume from (skips the tier lookup of the first page).
+
+    If a user does not have a minimum monthly tier, the database will set that value to 0.
+    Their monthly income estimate will be derived from the median monthly sponsor cost.
+    """
+    sponsors_list: list[int] = []
+    private_sponsors_count = 0
+    lowest_tier_cost = 0
+
     print(f"Starting Sponsors Fetch for {user_type} ''")
     start_time = time.time()
 
+    for sponsor_ids, private_count, tier_cost in iter_sponsor_pages(
+        github_id, user_type, cursor
+    ):
+        sponsors_list.extend(sponsor_ids)
+        private_sponsors_count += private_count
+        lowest_tier_cost = lowest_tier_cost or tier_cost
+
+    end_time = time.time()
+    logging.info(f"API fetch completed in {end_time - start_time:.2f} seconds.")
+    print(sponsors_list, len(sponsors_list))
+
+    return sponsors_list, private_sponsors_count, lowest_tier_cost
+
+
+# Yields the sponsors of a user one page at a time as (sponsor_ids, private_count, lowest_tier_cost)
+# The tier cost is only read from the first page (when no cursor is passed), 0 on every other page
+def iter_sponsor_pages(github_id, user_type, cursor=None):
+    node_id = get_node_id(github_id, user_type)
+    has_next_page = True
+    query_template = sponsors_query(user_type)
+
     while has_next_page:
         # Corrected variables dictionary. The key 'nodeId' must match the query variable '$nodeId'.
         variables = {"nodeId": node_id, "cursor": cursor}
@@ -120,18 +452,9 @@ def get_sponsors_from_api(github_id, user_type):
             logging.warning("Could not find entity with the provided ID.")
             break
 
+        lowest_tier_cost = 0
         if not cursor:  # First page
-            sponsors_listing = entity_data.get("sponsorsListing")
-            if sponsors_listing and sponsors_listing.get("tiers"):
-                tiers = sponsors_listing["tiers"]["nodes"]
-                monthly_prices_in_cents = [
-                    tier["monthlyPriceInCents"]
-                    for tier in tiers
-                    if not tier.get("isOneTime") and "monthlyPriceInCents" in tier
-                ]
-                if monthly_prices_in_cents:
-                    lowest_tier_cost = min(monthly_prices_in_cents) / 100
-                    logging.info(f"Lowest monthly tier: ${lowest_tier_cost:.2f}")
+            lowest_tier_cost = parse_lowest_tier(entity_data.get("sponsorsListing"))
 
         sponsorships = entity_data.get("sponsorshipsAsMaintainer")
         if not sponsorships:
@@ -142,72 +465,102 @@ def get_sponsors_from_api(github_id, user_type):
             total_sponsors = sponsorships.get("totalCount", 0)
             logging.info(f"Total sponsors reported by API: {total_sponsors}")
 
-        for node in sponsorships.get("nodes", []):
-            if not node:
-                continue
-            if node.get("privacyLevel") == "PRIVATE":
-                private_sponsors_count += 1
-            elif node.get("sponsorEntity") and node["sponsorEntity"].get("databaseId"):
-                sponsors_list.append(node["sponsorEntity"]["databaseId"])
+        sponsor_ids, private_count = parse_sponsor_nodes(sponsorships.get("nodes", []))
+        yield sponsor_ids, private_count, lowest_tier_cost
 
         page_info = sponsorships.get("pageInfo", {})
         has_next_page = page_info.get("hasNextPage", False)
         cursor = page_info.get("endCursor")
 
-    end_time = time.time()
-    logging.info(f"API fetch completed in {end_time - start_time:.2f} seconds.")
-    print(sponsors_list, len(sponsors_list))
+
+# Async counterpart of get_sponsors_from_api
+async def async_get_sponsors_from_api(client, github_id, user_type, cursor=None):
+    sponsors_list: list[int] = []
+    private_sponsors_count = 0
+    lowest_tier_cost = 0
+
+    async for sponsor_ids, private_count, tier_cost in async_iter_sponsor_pages(
+        client, github_id, user_type, cursor
+    ):
+        sponsors_list.extend(sponsor_ids)
+        private_sponsors_count += private_count
+        lowest_tier_cost = lowest_tier_cost or tier_cost
 
     return sponsors_list, private_sponsors_count, lowest_tier_cost
 
 
+# Async counterpart of iter_sponsor_pages
+async def async_iter_sponsor_pages(client, github_id, user_type, cursor=None):
+    node_id = get_node_id(github_id, user_type)
+    has_next_page = True
+    query_template = sponsors_query(user_type)
+
+    while has_next_page:
+        variables = {"nodeId": node_id, "cursor": cursor}
+        query = {"query": query_template, "variables": variables}
+
+        try:
+            response = await asyncPostRequest(client, URL, json=query)
+            data = response.json()
+        except Exception as e:
+            logging.error(f"Failed to fetch sponsors for ID '{github_id}'. Error: {e}")
+            break
+
+        if "errors" in data:
+            logging.error(f"GraphQL errors: {data['errors']}")
+            break
+
+        entity_data = data.get("data", {}).get("node", {})
+        if not entity_data:
+            logging.warning(f"Could not find entity with the provided ID {github_id}.")
+            break
+
+        lowest_tier_cost = 0
+        if not cursor:
+            lowest_tier_cost = parse_lowest_tier(entity_data.get("sponsorsListing"))
+
+        sponsorships = entity_data.get("sponsorshipsAsMaintainer")
+        if not sponsorships:
+            logging.info(f"Could not retrieve sponsorships for ID {github_id}.")
+            break
+
+        sponsor_ids, private_count = parse_sponsor_nodes(sponsorships.get("nodes", []))
+        yield sponsor_ids, private_count, lowest_tier_cost
+
+        page_info = sponsorships.get("pageInfo", {})
+        has_next_page = page_info.get("hasNextPage", False)
+        cursor = page_info.get("endCursor")
+
+
 # Returns an array of users who are sponsored by the passed in user
-def get_sponsored_from_api(github_id, user_type):
+def get_sponsored_from_api(github_id, user_type, cursor=None):
     """
     Fetches all sponsored for a given user or organization using the GitHub GraphQL API.
     :param github_id: The database ID of the user or organization.
     :param user_type: The type of account, either 'user' or 'organization'.
+    :param cursor: Optional page cursor to resume from.
     """
-    if user_type.lower() not in ["user", "organization"]:
-        raise ValueError("user_type must be 'user' or 'organization'")
-
-    # The prefix for a User ID is '04:' and for an Organization ID is '12:'.
-    # This is not officially documented but is the current standard.
-    prefix = "04:" if user_type.lower() == "user" else "12:"
-    node_id = base64.b64encode(
-        f"{prefix}{user_type.title()}{github_id}".encode("utf-8")
-    ).decode("utf-8")
-
     sponsored_list: list[int] = []
-    has_next_page = True
-    cursor = None
-
-    # Dynamic query template for the Github GraphQL API
-    query_template = f"""
-    query($nodeId: ID!, $cursor: String) {{
-      node(id: $nodeId) {{
-        ... on {user_type.title()} {{
-          sponsorshipsAsSponsor(first: 100, after: $cursor) {{
-            totalCount
-            pageInfo {{
-              endCursor
-              hasNextPage
-            }}
-            nodes {{
-              sponsorable {{
-                ... on User {{ databaseId }}
-                ... on Organization {{ databaseId }}
-              }}
-            }}
-          }}
-        }}
-      }}
-    }}
-    """
 
     start_time = time.time()
 
     logging.info(f"Starting Sponsoring Fetch for {user_type} ID '{github_id}'")
+    for sponsored_ids in iter_sponsored_pages(github_id, user_type, cursor):
+        sponsored_list.extend(sponsored_ids)
+
+    end_time = time.time()
+    logging.info(f"API fetch completed in {end_time - start_time:.2f} seconds.")
+    print(sponsored_list, len(sponsored_list))
+    return sponsored_list
+
+
+# Yields the ids of the users sponsored by a user one page at a time
+def iter_sponsored_pages(github_id, user_type, cursor=None):
+    node_id = get_node_id(github_id, user_type)
+    has_next_page = True
+    response = None
+    query_template = sponsoring_query(user_type)
+
     while has_next_page:
         variables = {"nodeId": node_id, "cursor": cursor}
         query = {"query": query_template, "variables": variables}
@@ -241,28 +594,67 @@ def get_sponsored_from_api(github_id, user_type):
             total_sponsoring = sponsored.get("totalCount", 0)
             logging.info(f"Total sponsored users reported by API: {total_sponsoring}")
 
-        for node in sponsored.get("nodes", []):
-            if (
-                node
-                and node.get("sponsorable")
-                and node["sponsorable"].get("databaseId")
-            ):
-                sponsored_list.append(node["sponsorable"]["databaseId"])
+        yield parse_sponsoring_nodes(sponsored.get("nodes", []))
 
         page_info = sponsored.get("pageInfo", {})
         has_next_page = page_info.get("hasNextPage", False)
         cursor = page_info.get("endCursor")
 
-    end_time = time.time()
-    logging.info(f"API fetch completed in {end_time - start_time:.2f} seconds.")
     if response:
         logging.info(
             f"Remaining Github API Tokens: {response.headers.get('X-RateLimit-Remaining')}"
         )
-    print(sponsored_list, len(sponsored_list))
+
+
+# Async counterpart of get_sponsored_from_api
+async def async_get_sponsored_from_api(client, github_id, user_type, cursor=None):
+    sponsored_list: list[int] = []
+    async for sponsored_ids in async_iter_sponsored_pages(
+        client, github_id, user_type, cursor
+    ):
+        sponsored_list.extend(sponsored_ids)
     return sponsored_list
 
 
+# Async counterpart of iter_sponsored_pages
+async def async_iter_sponsored_pages(client, github_id, user_type, cursor=None):
+    node_id = get_node_id(github_id, user_type)
+    has_next_page = True
+    query_template = sponsoring_query(user_type)
+
+    while has_next_page:
+        variables = {"nodeId": node_id, "cursor": cursor}
+        query = {"query": query_template, "variables": variables}
+
+        try:
+            response = await asyncPostRequest(client, URL, json=query)
+            data = response.json()
+        except Exception as e:
+            logging.error(
+                f"Permanently failed to fetch sponsored for ID '{github_id}' after all retries. Error: {e}"
+            )
+            break
+
+        if "errors" in data:
+            logging.error(f"GraphQL errors: {data['errors']}")
+            break
+
+        entity_data = data.get("data", {}).get("node", {})
+        if not entity_data:
+            logging.warning(f"Could not find entity with the provided ID {github_id}.")
+            break
+
+        sponsored = entity_data.get("sponsorshipsAsSponsor")
+        if not sponsored:
+            break
+
+        yield parse_sponsoring_nodes(sponsored.get("nodes", []))
+
+        page_info = sponsored.get("pageInfo", {})
+        has_next_page = page_info.get("hasNextPage", False)
+        cursor = page_info.get("endCursor")
+
+
 # Recursively queries the Github GraphQL API to collect users who are sponsorable
 def getSponsorableUsers(db, init: bool):
     """Retrieve GitHub account IDs for accounts that are sponsorable by querying the GitHub GraphQL API.
@@ -288,6 +680,14 @@ def getSponsorableUsers(db, init: bool):
     if not init:
         sort_clause = "sort:joined-desc"
 
+    # Found ids are queued in bulk (streamed with COPY) rather than one statement per search page
+    pending_ids = []
+
+    def queue_pending(force=False):
+        if pending_ids and (force or len(pending_ids) > BULK_LOAD_THRESHOLD):
+            batchAddQueue(pending_ids, 1, db)
+            pending_ids.clear()
+
     # helper to page through a search query (when userCount <= 1000)
     def fetch_and_queue(search_query):
         cursor = None
@@ -328,7 +728,8 @@ def getSponsorableUsers(db, init: bool):
                     user_ids.append(dbid)
 
             if user_ids:
-                batchAddQueue(user_ids, 1, db)
+                pending_ids.extend(user_ids)
+                queue_pending()
                 total_fetched += len(user_ids)
 
             page_info = search.get("pageInfo", {})
@@ -401,5 +802,6 @@ def getSponsorableUsers(db, init: bool):
         start = today - timedelta(weeks=2)
 
     total = fetch_range(start, today)
+    queue_pending(force=True)
     logging.info("Finished sponsorable collection. Total queued: %d", total)
     return
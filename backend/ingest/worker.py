@@ -1,39 +1,58 @@
 # DB Queries
 from backend.db.queries.queue import (
-    getFirstInQueue,
     batchAddQueue,
     batchRequeue,
-    updateStatus,
     enqueueStaleUsers,
     # checkStatus,
 )
 from backend.db.queries.users import (
-    createUser,
-    enrichUser,
+    getUserData,
     findUser,
     batchCreateUser,
-    finalizeUserScrape,
 )
 from backend.db.queries.sponsors import (
-    syncSponsors,
-    syncSponsorships,
+    clearStagedSponsorships,
+    stageSponsorships,
 )
 from backend.db.queries.user_activity import (
-    getUserActivity,
-    refreshActivityCheck,
+    fetchUserActivity,
+    planActivityYears,
 )
 
 # Ingest/Scraper
-from backend.ingest.utils import get_sponsorships, getSponsorableUsers
+from backend.ingest.utils import (
+    get_sponsorships_entry,
+    complete_sponsorships,
+    is_large_entry,
+    iter_sponsorship_pages,
+    getSponsorableUsers,
+)
 from backend.ingest.init_check import (
     load_worker_state,
     update_worker_state,
 )
+from backend.ingest.frontier import Frontier
+from backend.ingest.db_writer import (
+    DatabaseWriter,
+    UserUpsert,
+    EdgeDiff,
+    ActivityRows,
+    QueueStatus,
+)
+from backend.models.UserModel import UserModel
 
 # Authentication And Database
 import psycopg2
 from backend.utils.db_conn import db_connection
 from backend.ingest.use_auth import get_auth, is_auth_expiring_soon
+from backend.utils.browser_pool import closeBrowserPools
+
+# Functional Imports
+import os
+import socket
+from dataclasses import dataclass, field
+from typing import Optional
+from dotenv import load_dotenv
 
 # Logging Imports
 import time
@@ -42,10 +61,191 @@ from datetime import datetime as date
 import logging
 from backend.logs.logger_config import init_logger, log_header
 
+load_dotenv()
+
 MAX_PRIORITY = 10
 
 
+# Loads the worker state and seeds the queue with sponsorable users when a (re)seed is due
+# Returns the init_run flag of the state, used to pick full or incremental seeding later on
+def seedQueue(db):
+    state = load_worker_state()
+    init_run, last_init_run = state.get("init_run"), state.get("last_init_run")
+    elapsed: datetime
+
+    # Parse last_init_run which is stored as an ISO 8601 string (e.g. 2025-08-24T18:21:35.226820)
+    if last_init_run:
+        try:
+            last_init_run = date.fromisoformat(last_init_run)
+        except Exception:
+            # Fallback for strict parsing with microseconds
+            last_init_run = date.strptime(last_init_run, "%Y-%m-%dT%H:%M:%S.%f")
+        # Total time sice the last run
+        elapsed = date.now() - last_init_run
+    else:
+        elapsed = None
+
+    # Else if time since is none or older than 1 year, treat this as an initial run
+    if last_init_run is None or (date.now() - last_init_run) > datetime.timedelta(
+        days=365
+    ):
+        getSponsorableUsers(db, True)
+    # If time since last_init_run is older than 2 weeks, incremental collection
+    elif elapsed > datetime.timedelta(weeks=2):
+        getSponsorableUsers(db, init_run)
+
+    # Only reset the state if the worker completed an initial run prior
+    if init_run == True:
+        update_worker_state()
+    return init_run
+
+
+# Computes the next queue priority of a crawled user from its number of sponsorship relations
+def nextPriority(priority, sponsor_count, sponsoring_count):
+    # User was discovered with sponsorship relations, increase priority of user
+    if sponsor_count or sponsoring_count:
+        return min(int(priority) + 1, MAX_PRIORITY)
+    # If no sponsor relationships exist
+    # Decrement the priority for subsequent searches, with a floor of 1.
+    return max(int(priority) - 1, 1)
+
+
+@dataclass
+class CrawlJob:
+    """A crawled user, collecting everything fetched for it until it is persisted."""
+
+    github_id: int
+    priority: int
+    started: float = field(default_factory=time.time)
+    identity: dict = field(default_factory=dict)
+    user_id: Optional[int] = None
+    user: Optional[UserModel] = None
+    # False until the sponsorships were fetched, the stored edges are only replaced once they are
+    sponsorships_fetched: bool = False
+    sponsors: list = field(default_factory=list)
+    sponsoring: list = field(default_factory=list)
+    sponsor_count: int = 0
+    sponsoring_count: int = 0
+    # Sponsorships staged page by page instead of held in `sponsors`/`sponsoring`
+    streamed: bool = False
+    private_count: int = 0
+    min_sponsor_tier: Optional[int] = None
+    activity: Optional[dict] = None
+    # GraphQL pronoun field, None when not fetched (the enrich stage then looks it up itself)
+    pronouns: Optional[str] = None
+
+
+# Stages every page of a large account, creating and queueing the discovered users as they arrive
+# Pages are committed one by one, the edges are only applied by the DB writer
+# `keep_leases` is called after every page, so the queue lease outlives a long crawl
+def stageSponsorshipPages(job, entry, db, keep_leases=None):
+    clearStagedSponsorships(job.github_id, db)
+    job.streamed = True
+    for direction, github_ids, page_private in iter_sponsorship_pages(
+        job.github_id, job.user.type, entry
+    ):
+        job.private_count += page_private
+        if not github_ids:
+            continue
+        batchCreateUser(github_ids, db=db)
+        batchAddQueue(github_ids, priority=5, db=db)
+        stageSponsorships(job.github_id, direction, github_ids, db)
+        # Staged count, only used to tell whether the account has any edges
+        if direction == "sponsors":
+            job.sponsor_count += len(github_ids)
+        else:
+            job.sponsoring_count += len(github_ids)
+        if keep_leases is not None:
+            keep_leases()
+
+
+# Write intents of a crawled user for the DB writer: the profile, both sponsorship directions
+# (and the users they discovered), activity, the scrape summary and the completed queue status.
+# They are committed together, so the queue entry is never completed for a half written user.
+def crawlWrites(job):
+    writes = [UserUpsert(job.user, bool(job.identity.get("user_exists", False)))]
+    if job.sponsorships_fetched:
+        writes.append(
+            EdgeDiff(job.github_id, job.sponsors, job.sponsoring, job.streamed)
+        )
+    if job.activity is not None:
+        writes.append(ActivityRows(job.github_id, job.user_id, job.activity))
+    writes.append(
+        QueueStatus(
+            job.github_id,
+            "completed",
+            nextPriority(job.priority, job.sponsor_count, job.sponsoring_count),
+            job.private_count,
+            job.min_sponsor_tier,
+        )
+    )
+    return writes
+
+
+# Identifies the worker holding a queue lease, unique per process across machines
+def defaultWorkerId():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
 class IngestWorker:
+    def __init__(self, worker_id=None, seed_queue=True):
+        self.worker_id = worker_id or defaultWorkerId()
+        # False when the launcher seeds the queue for the whole fleet
+        self.seed_queue = seed_queue
+        # Queue entries leased to this worker, ordered locally by priority
+        self.frontier = Frontier(self.worker_id)
+
+    # Seeds the queue when due (unless the launcher does), returns the init_run flag of the state
+    def checkSeed(self, db):
+        if self.seed_queue:
+            return seedQueue(db)
+        return load_worker_state().get("init_run")
+
+    # Returns the next queue entry from the frontier, refilling it from the queue table when
+    # it runs low. Returns None if the queue is empty.
+    def nextEntry(self):
+        if self.frontier.needsRefill():
+            self.frontier.refill(self.conn)
+        else:
+            if self.frontier.shouldFlush():
+                self.frontier.flush(self.conn)
+            self.keepLeases()
+        return self.frontier.pop()
+
+    # Renews the leases of the entries this worker holds once half their lease has passed
+    def keepLeases(self):
+        if self.frontier.renewDue():
+            self.frontier.renew(self.conn)
+
+    # Records the final status (and new priority) of a crawled entry, written back in batches
+    def completeEntry(self, github_id, status, priority=None):
+        self.frontier.complete(github_id, status, priority)
+
+    # Hands an entry whose crawl failed back to the queue, so a transient error is retried
+    def retryEntry(self, github_id):
+        self.frontier.retry(github_id)
+
+    # Hands the writes of a crawled user to the DB writer, crawling continues while they are applied
+    def persist(self, job):
+        future = self.writer.submit(job.github_id, crawlWrites(job))
+        future.add_done_callback(lambda future: self.writeDone(job, future))
+
+    # Called by the DB writer once the writes of a user are committed (or failed)
+    def writeDone(self, job, future):
+        error = future.exception()
+        if error is None:
+            self.frontier.written(job.github_id)
+            elapsed = time.time() - job.started
+            logging.info(
+                f"user Github ID {job.github_id} crawled: {elapsed:.2f} seconds elapsed"
+            )
+        else:
+            if isinstance(error, psycopg2.OperationalError):
+                logging.warning(
+                    f"DB connection lost while writing {job.github_id}: {error}"
+                )
+            self.retryEntry(job.github_id)
+
     def run(self):
         """
         Main worker program to ingest, scrape and and insert data from Github API to database.
@@ -55,10 +255,10 @@ class IngestWorker:
         - Establish neccessary connections to database and logger.
         - On first run, create `worker_state.json` to track initialization status and last run time.
         - Enter main `while True` loop:
-            1.  **State & Seeding**: Load worker state. If it's the first run or has been a long time, seed the queue by fetching all "Sponsorable" users from GitHub.
+            1.  **State & Seeding**: Load worker state. If it's the first run or has been a long time, seed the queue by fetching all "Sponsorable" users from GitHub (workers started by the launcher leave this to the launcher).
             2.  **Authentication**: Check if the GitHub auth token is expiring and refresh it if needed.
             3.  **Periodic Tasks**: Every 4 hours, re-establish the database connection and enqueue any "stale" users (not scraped in 7 days) for reprocessing.
-            4.  **Fetch from Queue**: Get the highest-priority user from the queue. If the queue is empty, attempt to re-seed.
+            4.  **Take from Frontier**: Pop the highest-priority user from the in-memory frontier. When it runs low, it is refilled by atomically claiming (leasing) a chunk of users from the queue, so several workers never crawl the same user. The leases of queued and in-progress users are renewed while they are held. If the queue is empty, attempt to re-seed.
             5.  **Enrich/Create User**: Check the user's status in the database. If they don't exist, create them. If they exist but lack full details, enrich them using GitHub's REST API.
             6.  **Crawl Sponsorships**: Fetch the user's sponsors and the users they are sponsoring via the GraphQL API.
             7.  **Adjust Priority & Enqueue New Users**:
@@ -66,49 +266,23 @@ class IngestWorker:
                 - If only existing relationships are found, the priority remains the same.
                 - If no relationships are found, decrement the priority.
             8.  **Sync Data**: Update the `sponsorship` table with the latest relationships and collect the user's historical activity data if needed.
-            9.  **Finalize**: Update the user's status to 'completed' in the queue and record the `last_scraped` timestamp.
+            9.  **Finalize**: Hand the user, its relationships and activity, the `last_scraped` timestamp and the user's 'completed' queue status to the background DB writer, which commits them together (grouped with other users) while the next user is crawled, so a crash never leaves a user half written. Skipped users are buffered and written back to the queue in batches.
             10. **Error Handling**: Catch and log database connection errors or other exceptions, with built-in reconnection logic and graceful shutdown.
         """
 
         # Establish database connection & logger
         init_logger()
         self.conn = db_connection()
+        self.writer = DatabaseWriter()
         log_header("Worker has Started")
 
         # Start rescraping timer
         last_stale_check = time.time()
 
         while True:
-            # Load the worker state
             start = time.time()
-            state = load_worker_state()
-            init_run, last_init_run = state.get("init_run"), state.get("last_init_run")
-            elapsed: datetime
-
-            # Parse last_init_run which is stored as an ISO 8601 string (e.g. 2025-08-24T18:21:35.226820)
-            if last_init_run:
-                try:
-                    last_init_run = date.fromisoformat(last_init_run)
-                except Exception:
-                    # Fallback for strict parsing with microseconds
-                    last_init_run = date.strptime(last_init_run, "%Y-%m-%dT%H:%M:%S.%f")
-                # Total time sice the last run
-                elapsed = date.now() - last_init_run
-            else:
-                elapsed = None
-
-            # Else if time since is none or older than 1 year, treat this as an initial run
-            if last_init_run is None or (
-                date.now() - last_init_run
-            ) > datetime.timedelta(days=365):
-                getSponsorableUsers(self.conn, True)
-            # If time since last_init_run is older than 2 weeks, incremental collection
-            elif elapsed > datetime.timedelta(weeks=2):
-                getSponsorableUsers(self.conn, init_run)
-
-            # Only reset the state if the worker completed an initial run prior
-            if init_run == True:
-                update_worker_state()
+            github_id = None
+            init_run = self.checkSeed(self.conn)
 
             check_auth = is_auth_expiring_soon()
             # If auth is close to expiration
@@ -127,8 +301,8 @@ class IngestWorker:
                     "4 Hours Elapsed: Re-establishing Fresh Database Connection."
                 )
             try:
-                #  Fetch first user from queue
-                data = getFirstInQueue(db=self.conn)
+                #  Take the next claimed user (leased to this worker until completed)
+                data = self.nextEntry()
 
                 # If all pending users have been scraped batch requeue all users
                 if not data:
@@ -145,124 +319,103 @@ class IngestWorker:
                 )
 
                 # Check if the user exists and if the user is enriched with REST API data
-                identity = findUser(github_id=github_id, db=self.conn)
+                job = CrawlJob(github_id=github_id, priority=priority, started=start)
+                job.identity = findUser(github_id=github_id, db=self.conn)
                 # Safe unpacking with defaults
-                user_id = identity.get("user_id")
-                user_exists = bool(identity.get("user_exists", False))
-                is_enriched = bool(identity.get("is_enriched", False))
+                job.user_id = job.identity.get("user_id")
+                user_exists = bool(job.identity.get("user_exists", False))
+                is_enriched = user_exists and bool(
+                    job.identity.get("is_enriched", False)
+                )
 
+                # Everything is fetched first and written at the end in a single transaction
                 try:
-                    # User exists in DB from previous sponsor relation
-                    if user_exists and is_enriched == False:
-                        # Enrich user metadata from Github API / gender inference
-                        user = enrichUser(github_id, db=self.conn)
-                        logging.info(
-                            f"Processing User: Github ID {github_id} at priority: {priority}"
-                        )
-                    # User has already been scraped for their data once (prevents unwanted future updates)
-                    elif user_exists and is_enriched == True:
-                        user = enrichUser(
-                            github_id,
-                            db=self.conn,
-                            enriched=is_enriched,
-                            identity=identity,
-                        )
-                        logging.info(
-                            f"User already enriched: Github ID {github_id} at priority: {priority}, Data has been refreshed."
-                        )
-                    # User does not exist in DB, create new user
-                    elif not user_exists:
-                        user, user_id = createUser(github_id, db=self.conn)
-                        logging.info(
-                            f"Creating User: Github ID {github_id} at priority: {priority}"
-                        )
+                    # Collect user metadata from Github API / gender inference
+                    # Already enriched users keep their identity unless their profile changed
+                    job.user = getUserData(
+                        github_id,
+                        db=self.conn,
+                        is_enriched=is_enriched,
+                        identity=job.identity if is_enriched else None,
+                    )
                 except ValueError as e:
                     logging.warning(
                         "User has been deleted. They do not exist on github (sponsors if previously existed have been updated)"
                     )
+                    self.completeEntry(github_id, "skipped")
                     continue
 
-                # Defensive checks: ensure we actually have a user object and a DB user_id
-                if user is None:
+                # Defensive checks: ensure we actually have a user object
+                if job.user is None:
                     logging.warning(
                         f"No user data returned for Github ID {github_id}; skipping."
                     )
-                    updateStatus(github_id=github_id, status="skipped", db=self.conn)
+                    self.completeEntry(github_id, "skipped")
                     continue
 
+                # User exists in DB from previous sponsor relation
+                if user_exists and not is_enriched:
+                    logging.info(
+                        f"Processing User: Github ID {github_id} at priority: {priority}"
+                    )
+                # User has already been scraped for their data once (prevents unwanted future updates)
+                elif user_exists:
+                    logging.info(
+                        f"User already enriched: Github ID {github_id} at priority: {priority}, Data has been refreshed."
+                    )
+                # User does not exist in DB, create new user
+                else:
+                    logging.info(
+                        f"Creating User: Github ID {github_id} at priority: {priority}"
+                    )
+
                 #  Crawl the user for sponsorship relations
                 print("Getting Sponsorships from GraphQL API:")
-                sponsors, sponsoring, private_count, min_sponsor_tier = (
-                    get_sponsorships(user.username, github_id, user.type)
-                )
-
-                # Always run the sync functions. They are responsible for adding new relationships
-                # AND removing old ones if the new lists are empty.
-                syncSponsors(github_id, sponsors, self.conn)
-                syncSponsorships(github_id, sponsoring, self.conn)
-
-                # Create a list of only the unique github_ids
-                # This is important if bi-directional sponsor relations exist
-                unique_users = list(set(sponsors) | set(sponsoring))
-                print(unique_users)
-
-                # Batch create unique users who are not present in the table
-                if unique_users:
-                    # User was discovered with new users, increase priority of user
-                    new_priority = min(int(priority) + 1, MAX_PRIORITY)
-
-                    # Create placeholder users to conform to foreign key constraint
-                    # Batch add users at a middle standing priority
-                    batchCreateUser(unique_users, db=self.conn)
-                    batchAddQueue(unique_users, priority=5, db=self.conn)
-
-                    # Collect the user activity from the Github API ONLY if the specified user HAS a sponsor or is sponsoring
-                    # Users without either dont need their user activity collected as they will not be shown in the dataset.
-                    print(f"\nCollecting User Activity Data:")
+                entry = get_sponsorships_entry(github_id, job.user.type)
+                # Empty lists would delete every stored edge, try the user again later instead
+                if entry is None:
+                    logging.warning(
+                        f"Sponsorships of Github ID {github_id} could not be fetched; retrying later."
+                    )
+                    self.retryEntry(github_id)
+                    continue
+                job.sponsorships_fetched = True
+                job.min_sponsor_tier = entry["min_sponsor_tier"]
 
-                    # Checks if the user activity does not exist or is over 365 days old,
-                    # otherwise skip this function due to it being quite resource intensive
-                    refresh_activity = refreshActivityCheck(user_id, self.conn)
-                    if refresh_activity:
-                        getUserActivity(
-                            github_id=github_id,
-                            user_id=user_id,
-                            user_type=user.type,
-                            created_at=user.github_created_at,
-                            db=self.conn,
-                        )
-                # If no new users were found, but existing sponsor/sponsoring relationships exist
-                elif sponsors or sponsoring:
-                    new_priority = priority
-                # If no new users are found, and no sponsor relationships exist
+                # Accounts with very large sponsor lists are staged page by page
+                if is_large_entry(entry):
+                    stageSponsorshipPages(job, entry, self.conn, self.keepLeases)
                 else:
-                    # Decrement the priority for subsequent searches, with a floor of 1.
-                    new_priority = max(int(priority) - 1, 1)
-
-                # Update staus and priority of the crawled user
-                updateStatus(
-                    github_id=github_id,
-                    status="completed",
-                    db=self.conn,
-                    priority=new_priority,
-                )
-
-                # Set last_scraped to the current time
-                finalizeUserScrape(
-                    github_id, private_count, min_sponsor_tier, db=self.conn
-                )
+                    (
+                        job.sponsors,
+                        job.sponsoring,
+                        job.private_count,
+                        job.min_sponsor_tier,
+                    ) = complete_sponsorships(github_id, job.user.type, entry)
+                    job.sponsor_count = len(job.sponsors)
+                    job.sponsoring_count = len(job.sponsoring)
+
+                # Collect the user activity from the Github API ONLY if the specified user HAS a sponsor or is sponsoring
+                # Users without either dont need their user activity collected as they will not be shown in the dataset.
+                # Organizations have no user activity, and closed years are frozen once collected
+                if (job.sponsor_count or job.sponsoring_count) and (
+                    job.user.type != "Organization"
+                ):
+                    print(f"\nCollecting User Activity Data:")
+                    created_at = job.user.github_created_at
+                    years = planActivityYears(job.user_id, created_at, self.conn)
+                    if years:
+                        job.activity = fetchUserActivity(github_id, created_at, years)
 
-                # Print the elapsed time taken to crawl the current user
-                end = time.time()
-                elapsed = end - start
-                logging.info(
-                    f"user Github ID {github_id} crawled: {elapsed:.2f} seconds elapsed"
-                )
-                time.sleep(1)  # Wait before checking queue again
+                # Write the user, its relations and activity and complete the queue entry at once,
+                # in the background while the next user is crawled
+                self.persist(job)
 
             # Handle operational error thrown by DB
             except psycopg2.OperationalError as e:
                 logging.warning(f"DB connection lost: {e}. Reconnecting...")
+                if github_id is not None:
+                    self.retryEntry(github_id)
                 self.conn = db_connection()
                 continue
             # If another error occurs, log the error and stop the scraper
@@ -271,6 +424,16 @@ class IngestWorker:
                 time.sleep(10)
                 break
 
+        # Write the users still waiting for the DB writer, then hand the entries this worker
+        # still holds back to the queue
+        self.writer.close()
+        logging.info(f"DB writer: {self.writer.stats()}")
+        try:
+            self.frontier.close(self.conn)
+        except psycopg2.Error as e:
+            logging.warning(f"Could not release queue leases: {e}")
+        closeBrowserPools()
+
 
 if __name__ == "__main__":
     worker = IngestWorker()
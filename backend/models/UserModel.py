@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 
 
@@ -27,6 +27,11 @@ class UserModel:
     last_scraped: Optional[datetime]
     is_enriched: Optional[bool]
     github_created_at: datetime
+    # Validators of the REST profile response, used for conditional re-enrichment
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # True when the profile was loaded from the database because GitHub reported it unchanged
+    is_cached: bool = False
 
     @classmethod
     def from_api(cls, data: dict):
@@ -53,4 +58,40 @@ class UserModel:
             last_scraped=None,
             is_enriched=None,
             github_created_at=data["created_at"],
+            etag=data.get("etag"),
+            last_modified=data.get("last_modified"),
+        )
+
+    @classmethod
+    def from_db(cls, row: dict):
+        created_at = row["github_created_at"]
+        return cls(
+            github_id=row["github_id"],
+            username=row["username"],
+            name=row["name"],
+            type=row["type"],
+            has_pronouns=bool(row["has_pronouns"]),
+            gender=row["gender"],
+            location=row["location"],
+            avatar_url=row["avatar_url"],
+            profile_url=row["profile_url"],
+            company=row["company"],
+            following=row["following"],
+            followers=row["followers"],
+            hireable=row["hireable"],
+            bio=row["bio"],
+            public_repos=row["public_repos"],
+            public_gists=row["public_gists"],
+            twitter_username=row["twitter_username"],
+            email=row["email"],
+            private_sponsor_count=row["private_sponsor_count"] or 0,
+            last_scraped=row["last_scraped"],
+            is_enriched=row["is_enriched"],
+            # Stored as timestamptz, kept in the API string format the rest of the worker expects
+            github_created_at=(
+                created_at.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+                if isinstance(created_at, datetime)
+                else created_at
+            ),
+            is_cached=True,
         )
@@ -0,0 +1,184 @@
+from backend.ingest import async_worker
+from backend.ingest.async_worker import AsyncIngestWorker, DatabaseRunner
+from backend.ingest.db_writer import UserUpsert, EdgeDiff, QueueStatus
+from backend.ingest.utils import parse_sponsorships_entry
+from backend.ingest.worker import CrawlJob
+
+import asyncio
+from concurrent.futures import Future
+
+PROFILE = {
+    "id": 42,
+    "login": "octo-org",
+    "name": "Octo Org",
+    "type": "Organization",
+    "location": None,
+    "avatar_url": "https://avatars.githubusercontent.com/u/42",
+    "html_url": "https://github.com/octo-org",
+    "following": 0,
+    "followers": 10,
+    "public_repos": 3,
+    "public_gists": 0,
+    "created_at": "2020-01-01T00:00:00Z",
+}
+
+
+class FakeConnection:
+    closed = False
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def getconn(self):
+        return FakeConnection()
+
+    def putconn(self, conn, close=False):
+        pass
+
+    def closeall(self):
+        pass
+
+
+# DatabaseRunner handing out fake connections, the calls go through the real `run`
+class FakeRunner(DatabaseRunner):
+    def __init__(self):
+        self.pool = FakePool()
+        self.slots = asyncio.Semaphore(1)
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {"ETag": '"v1"'}
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+# Stands in for asyncGetRequest, recording the validators each request was sent with
+def fake_get_request(response, requests):
+    async def get(client, url, etag=None, last_modified=None):
+        requests.append((url, etag, last_modified))
+        return response
+
+    return get
+
+
+class FakeBatcher:
+    def __init__(self, result=None):
+        self.result = result
+
+    async def fetch(self, key, *args):
+        return self.result
+
+
+# DB writer committing every submitted user immediately
+class FakeWriter:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, github_id, writes):
+        self.submitted.append((github_id, writes))
+        future = Future()
+        future.set_result(None)
+        return future
+
+
+async def crawl(worker, job):
+    next_stage = await worker.fetchStage(job)
+    while next_stage is not None:
+        handler, _ = worker.stages[next_stage]
+        next_stage = await handler(job)
+    # Let the writer's done callback run on the loop
+    await asyncio.sleep(0)
+
+
+def test_job_reaches_the_db_writer(monkeypatch):
+    monkeypatch.setattr(
+        async_worker,
+        "findUser",
+        lambda github_id, db: {"user_exists": True, "is_enriched": True, "user_id": 7},
+    )
+    requests = []
+    monkeypatch.setattr(async_worker, "getEtag", lambda url, db: ('"v0"', None))
+    monkeypatch.setattr(
+        async_worker,
+        "asyncGetRequest",
+        fake_get_request(FakeResponse(200, PROFILE), requests),
+    )
+
+    worker = AsyncIngestWorker(worker_id="test")
+    worker.db = FakeRunner()
+    worker.client = None
+    worker.writer = FakeWriter()
+    # A user without any sponsorship
+    worker.sponsorships = FakeBatcher(parse_sponsorships_entry({}))
+    worker.pronouns = FakeBatcher()
+
+    job = CrawlJob(github_id=42, priority=5)
+    asyncio.run(crawl(worker, job))
+
+    assert len(worker.writer.submitted) == 1
+    github_id, writes = worker.writer.submitted[0]
+    assert github_id == 42
+    assert isinstance(writes[0], UserUpsert)
+    assert writes[0].user.username == "octo-org"
+    assert writes[0].user.etag == '"v1"'
+    assert requests == [("https://api.github.com/user/42", '"v0"', None)]
+    assert writes[1] == EdgeDiff(42, [], [], False)
+    assert isinstance(writes[-1], QueueStatus)
+    assert writes[-1].status == "completed"
+    # A user without sponsorships loses priority
+    assert writes[-1].priority == 4
+    assert worker.frontier.completions == []
+
+
+def test_unchanged_profile_is_loaded_from_the_db(monkeypatch):
+    stored = []
+    monkeypatch.setattr(async_worker, "getEtag", lambda url, db: ('"v1"', None))
+    monkeypatch.setattr(
+        async_worker, "asyncGetRequest", fake_get_request(FakeResponse(304), [])
+    )
+    monkeypatch.setattr(
+        async_worker,
+        "getStoredUser",
+        lambda github_id, db: stored.append(github_id) or "stored user",
+    )
+
+    worker = AsyncIngestWorker(worker_id="test")
+    worker.db = FakeRunner()
+    worker.client = None
+
+    user = asyncio.run(worker.fetchProfile(42, is_enriched=True))
+
+    assert user == "stored user"
+    assert stored == [42]
+
+
+def test_failed_sponsorship_fetch_is_retried(monkeypatch):
+    monkeypatch.setattr(
+        async_worker,
+        "findUser",
+        lambda github_id, db: {"user_exists": True, "is_enriched": True, "user_id": 7},
+    )
+    monkeypatch.setattr(async_worker, "getEtag", lambda url, db: (None, None))
+    monkeypatch.setattr(
+        async_worker,
+        "asyncGetRequest",
+        fake_get_request(FakeResponse(200, PROFILE), []),
+    )
+
+    worker = AsyncIngestWorker(worker_id="test")
+    worker.db = FakeRunner()
+    worker.client = None
+    worker.writer = FakeWriter()
+    worker.sponsorships = FakeBatcher(None)
+    worker.pronouns = FakeBatcher()
+
+    asyncio.run(crawl(worker, CrawlJob(github_id=42, priority=5)))
+
+    assert worker.writer.submitted == []
+    assert worker.frontier.retries == [42]
@@ -0,0 +1,49 @@
+from backend.ingest import db_writer
+from backend.ingest.db_writer import DatabaseWriter, QueueStatus
+
+import pytest
+
+
+class FakeConnection:
+    closed = False
+
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_failing_user_does_not_fail_its_group(monkeypatch):
+    applied = []
+
+    def apply_writes(writes, db):
+        if any(write.github_id == 2 for write in writes):
+            raise RuntimeError("constraint violated")
+        applied.append([write.github_id for write in writes])
+
+    monkeypatch.setattr(db_writer, "applyWrites", apply_writes)
+    conn = FakeConnection()
+    writer = DatabaseWriter(group_size=3, wait=1, connect=lambda: conn)
+
+    futures = [
+        writer.submit(github_id, [QueueStatus(github_id, "completed")])
+        for github_id in (1, 2, 3)
+    ]
+    writer.close()
+
+    assert futures[0].result() is None
+    assert futures[2].result() is None
+    with pytest.raises(RuntimeError):
+        futures[1].result()
+    # The group is retried user by user once it fails as a whole
+    assert applied == [[1], [3]]
+    assert conn.commits == 2
+    assert writer.stats()["written"] == 2
+    assert writer.stats()["failed"] == 1
@@ -0,0 +1,46 @@
+from backend.ingest import frontier
+from backend.ingest.async_worker import AsyncIngestWorker
+from backend.ingest.frontier import Frontier
+from backend.ingest.worker import CrawlJob
+
+from concurrent.futures import Future
+
+
+def held_frontier(*github_ids):
+    queue = Frontier(worker_id="test")
+    for priority, github_id in enumerate(github_ids):
+        queue.heap.append((priority, None, github_id))
+    return queue
+
+
+def test_written_entries_stop_being_renewed(monkeypatch):
+    renewed = []
+    monkeypatch.setattr(
+        frontier,
+        "renewLeases",
+        lambda github_ids, worker_id, db: renewed.append(sorted(github_ids)),
+    )
+    worker = AsyncIngestWorker(worker_id="test")
+    worker.frontier = held_frontier(1, 2, 3)
+    first, second = worker.frontier.pop(), worker.frontier.pop()
+
+    written = Future()
+    written.set_result(None)
+    worker.writeDone(CrawlJob(github_id=first["github_id"], priority=5), written)
+
+    assert worker.frontier.in_flight == {second["github_id"]}
+    worker.frontier.renew(db=None)
+    assert renewed == [[2, 3]]
+
+
+def test_failed_writes_are_retried():
+    worker = AsyncIngestWorker(worker_id="test")
+    worker.frontier = held_frontier(1)
+    entry = worker.frontier.pop()
+
+    failed = Future()
+    failed.set_exception(RuntimeError("write failed"))
+    worker.writeDone(CrawlJob(github_id=entry["github_id"], priority=5), failed)
+
+    assert worker.frontier.in_flight == set()
+    assert worker.frontier.retries == [1]
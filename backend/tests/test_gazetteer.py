@@ -0,0 +1,23 @@
+from backend.utils.gazetteer import getGazetteer
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "location, country",
+    [
+        ("Austin, TX", "United States"),
+        ("Austin TX", "United States"),
+        ("Portland, OR", "United States"),
+        ("Toronto, ON", "Canada"),
+        ("Germany", "Germany"),
+        ("TX, USA", "United States"),
+    ],
+)
+def test_resolves_places(location, country):
+    assert getGazetteer().resolve(location) == (True, country)
+
+
+@pytest.mark.parametrize("location", ["Hi!", "Co", "OK", "La Paz", "Co. Cork", "Or"])
+def test_bare_abbreviations_are_left_to_the_geocoder(location):
+    assert getGazetteer().resolve(location) == (False, None)
@@ -0,0 +1,46 @@
+from backend.utils import github_api
+from backend.utils.github_api import TokenPool, isRateLimited
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("No JSON body")
+        return self.body
+
+
+def test_graphql_rate_limit_error_is_rate_limited():
+    res = FakeResponse(
+        200,
+        {"X-RateLimit-Remaining": "0"},
+        {
+            "data": None,
+            "errors": [{"type": "RATE_LIMITED", "message": "API rate limit exceeded"}],
+        },
+    )
+    assert isRateLimited(res)
+
+
+def test_successful_responses_are_not_rate_limited():
+    assert not isRateLimited(
+        FakeResponse(200, {"X-RateLimit-Remaining": "0"}, {"data": {}})
+    )
+    assert not isRateLimited(FakeResponse(200, body=[{"id": 1}]))
+    assert not isRateLimited(FakeResponse(304))
+    assert not isRateLimited(FakeResponse(403, {"X-RateLimit-Remaining": "12"}))
+    assert isRateLimited(FakeResponse(429, {"X-RateLimit-Remaining": "0"}))
+
+
+def test_rate_limited_token_is_skipped(monkeypatch):
+    pool = TokenPool(["a", "b"])
+    monkeypatch.setattr(github_api, "TOKEN_POOL", pool)
+    pool.update("b", "graphql", 100, 4102444800)
+
+    github_api.markRateLimited("a", FakeResponse(200), "graphql")
+
+    assert pool.next_token("graphql") == ("b", 0)
@@ -0,0 +1,41 @@
+from backend.ingest.db_writer import UserUpsert, EdgeDiff, QueueStatus
+from backend.ingest.worker import CrawlJob, crawlWrites
+from backend.models.UserModel import UserModel
+
+PROFILE = {
+    "id": 42,
+    "login": "octocat",
+    "name": "Octo Cat",
+    "type": "User",
+    "location": None,
+    "avatar_url": "https://avatars.githubusercontent.com/u/42",
+    "html_url": "https://github.com/octocat",
+    "following": 0,
+    "followers": 10,
+    "public_repos": 3,
+    "public_gists": 0,
+    "created_at": "2020-01-01T00:00:00Z",
+}
+
+
+def crawled_job(**fields):
+    user = UserModel.from_api(PROFILE)
+    return CrawlJob(github_id=42, priority=5, user=user, **fields)
+
+
+def test_failed_sponsorship_fetch_keeps_the_stored_edges():
+    writes = crawlWrites(crawled_job())
+
+    assert not any(isinstance(write, EdgeDiff) for write in writes)
+    assert isinstance(writes[0], UserUpsert)
+    assert isinstance(writes[-1], QueueStatus)
+
+
+def test_fetched_sponsorships_replace_the_stored_edges():
+    job = crawled_job(
+        sponsorships_fetched=True, sponsors=[1, 2], sponsoring=[3], sponsor_count=2
+    )
+
+    writes = crawlWrites(job)
+
+    assert EdgeDiff(42, [1, 2], [3], False) in writes
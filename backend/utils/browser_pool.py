@@ -0,0 +1,123 @@
+from playwright.sync_api import sync_playwright
+from concurrent.futures import Future
+from dotenv import load_dotenv
+import os
+import queue
+import threading
+import logging
+
+load_dotenv()
+
+# File pathname of the GitHub authentication state shared by every browser context
+AUTH_PATH = "auth.json"
+# Number of long-lived browsers (one per thread) visiting GitHub pages at the same time
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))
+# Resources not needed to read server rendered profile fields such as the pronoun span
+BLOCKED_RESOURCES = {"image", "font", "media", "stylesheet", "script"}
+
+
+def blockResources(route):
+    if route.request.resource_type in BLOCKED_RESOURCES:
+        route.abort()
+    else:
+        route.continue_()
+
+
+# Modification time of the auth file, changes whenever get_auth stores a new login
+def authVersion(auth_path):
+    try:
+        return os.path.getmtime(auth_path)
+    except OSError:
+        return None
+
+
+class BrowserPool:
+    """
+    Long-lived Chromium browsers that hand out pages for GitHub profile visits.
+
+    Playwright's sync API is bound to the thread that started it, so every browser lives in its
+    own thread and `run` queues a page callback to the next free one. Each thread keeps a
+    logged-in context from `auth_path` and replaces it once the auth file changes.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, auth_path=AUTH_PATH):
+        self.auth_path = auth_path
+        self.jobs = queue.Queue()
+        self.threads = [
+            threading.Thread(target=self._serve, name=f"browser-{index}", daemon=True)
+            for index in range(size)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    # Calls fn(page) on a fresh page of a pooled context and returns its result
+    def run(self, fn, block_resources=True):
+        future = Future()
+        self.jobs.put((fn, block_resources, future))
+        return future.result()
+
+    def close(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def _newContext(self, browser, version):
+        if version is None:
+            return browser.new_context()
+        return browser.new_context(storage_state=self.auth_path)
+
+    def _serve(self):
+        with sync_playwright() as p:
+            browser, context, version = None, None, None
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    break
+                fn, block_resources, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    # Relaunch a crashed browser and recycle the context after an auth refresh
+                    if browser is None or not browser.is_connected():
+                        browser = p.chromium.launch(headless=True)
+                        context = None
+                    current = authVersion(self.auth_path)
+                    if context is None or current != version:
+                        if context is not None:
+                            context.close()
+                            logging.debug("Auth changed, recycling browser context.")
+                        context = self._newContext(browser, current)
+                        version = current
+
+                    page = context.new_page()
+                    try:
+                        if block_resources:
+                            page.route("**/*", blockResources)
+                        future.set_result(fn(page))
+                    finally:
+                        page.close()
+                except Exception as e:
+                    future.set_exception(e)
+            if browser is not None:
+                browser.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# Returns the browser pool of this process, started on first use
+def getBrowserPool(auth_path=AUTH_PATH):
+    with _pools_lock:
+        if auth_path not in _pools:
+            _pools[auth_path] = BrowserPool(auth_path=auth_path)
+        return _pools[auth_path]
+
+
+def closeBrowserPools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -1,6 +1,7 @@
 from dotenv import load_dotenv
 import os
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 
 # Used to connect to the database
 load_dotenv()
@@ -22,3 +23,53 @@ def db_connection():
         host=os.getenv("host"),
         port=os.getenv("port"),
     )
+
+
+# Thread-safe pool of connections, used when several threads issue queries at once
+def db_pool(minconn, maxconn):
+    return ThreadedConnectionPool(
+        minconn,
+        maxconn,
+        dbname=os.getenv("dbname"),
+        user=os.getenv("user"),
+        password=os.getenv("password"),
+        host=os.getenv("host"),
+        port=os.getenv("port"),
+    )
+
+
+class UnitOfWork:
+    """
+    Groups the writes of several query functions into a single transaction.
+
+    The query functions commit their own work when passed a connection. Passed a unit of work
+    as `db` instead, their commits are deferred: every statement runs on the wrapped connection
+    and is committed once when the `with` block exits, or rolled back together if it raises.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            if not self.conn.closed:
+                self.conn.rollback()
+            return False
+        self.conn.commit()
+        return False
+
+    def cursor(self, *args, **kwargs):
+        return self.conn.cursor(*args, **kwargs)
+
+    # Deferred to the end of the unit of work
+    def commit(self):
+        return
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
@@ -0,0 +1,160 @@
+from pathlib import Path
+import difflib
+import json
+import re
+import unicodedata
+
+# Bundled list of countries, subdivisions and major cities (with aliases) used to resolve
+# common GitHub locations without a Nominatim request
+GAZETTEER_FILE = Path(__file__).resolve().parent / "gazetteer.json"
+# Longest place name (in words) matched inside a location part
+MAX_PHRASE_WORDS = 4
+# Aliases this short only match a whole part or the last word of one ("Seattle, WA", "Austin TX")
+SHORT_ALIAS = 3
+# Similarity needed for a misspelled part ("Germnay") to count as a match
+FUZZY_CUTOFF = 0.85
+
+
+# Lowercases, strips accents and punctuation ("São Paulo" -> "sao paulo")
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+    return text.strip()
+
+
+class Gazetteer:
+    """
+    Offline country resolver for free-text locations.
+
+    Every name is indexed (normalized) to the set of countries it can refer to. A location is split
+    into parts on commas and slashes; each part is matched whole, then by its longest known
+    phrases, then fuzzily. A part that is a country name decides the result on its own, otherwise
+    the candidate sets of all matched places must agree on exactly one country ("Portland, OR"
+    but not "Paris, TX"). State and province abbreviations only count after a place name, so a
+    bare "Hi" or "Co" resolves nothing. Anything unsure is left to Nominatim.
+    """
+
+    def __init__(self, path=GAZETTEER_FILE):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        # name -> (is_country, frozenset of countries)
+        self.index = {}
+        for country, aliases in data["countries"].items():
+            for name in [country, *aliases]:
+                self._add(name, country, True)
+        for country, names in data["places"].items():
+            for name in names:
+                self._add(name, country, False)
+        for country, names in data["abbreviations"].items():
+            for name in names:
+                self._add(name, country, False)
+        # Names shared by several countries replace whatever the sections above indexed
+        for name, countries in data["ambiguous"].items():
+            self.index[normalize(name)] = (False, frozenset(countries))
+        # State and province codes ("TX", and the ambiguous "CA" and "WA")
+        self.abbreviations = {
+            normalize(name)
+            for names in data["abbreviations"].values()
+            for name in names
+        } | {normalize(name) for name in data["ambiguous"] if len(name) <= SHORT_ALIAS}
+        self.nowhere = {normalize(name) for name in data["nowhere"]}
+
+        # Candidates for fuzzy matching, bucketed by first letter
+        self.fuzzy = {}
+        for name in self.index:
+            if len(name) > SHORT_ALIAS + 1:
+                self.fuzzy.setdefault(name[0], []).append(name)
+
+    def _add(self, name, country, is_country):
+        name = normalize(name)
+        found = self.index.get(name)
+        if found is None:
+            self.index[name] = (is_country, frozenset([country]))
+        else:
+            # Same name for a country and a place (or two places) of different countries
+            self.index[name] = (found[0] or is_country, found[1] | {country})
+
+    # Known names found in one normalized part of a location,
+    # as (is_country, countries, is_abbreviation)
+    # A country only decides the result when it is the whole part, so "Panama City, FL" is
+    # matched as places (Panama and the US, which disagree)
+    def _matchPart(self, part):
+        if part in self.index:
+            return [(*self.index[part], part in self.abbreviations)]
+
+        words = part.split()
+        matches, short_tail = [], False
+        start = 0
+        while start < len(words):
+            # Longest phrase first, so "new mexico" wins over "mexico"
+            for size in range(min(MAX_PHRASE_WORDS, len(words) - start), 0, -1):
+                phrase = " ".join(words[start : start + size])
+                is_last = start + size == len(words)
+                if phrase in self.index and (len(phrase) > SHORT_ALIAS or is_last):
+                    matches.append(
+                        (False, self.index[phrase][1], phrase in self.abbreviations)
+                    )
+                    short_tail = len(phrase) <= SHORT_ALIAS
+                    start += size
+                    break
+            else:
+                start += 1
+        # A trailing abbreviation needs a place next to it ("Austin TX", but not "Join us")
+        if matches and not (short_tail and len(matches) == 1):
+            return matches
+
+        close = difflib.get_close_matches(
+            part, self.fuzzy.get(part[:1], []), n=1, cutoff=FUZZY_CUTOFF
+        )
+        return [(*self.index[close[0]], False)] if close else []
+
+    def resolve(self, location):
+        """
+        Resolves a cleaned location string to a country.
+
+        Returns (resolved, country): (True, country) for a confident match, (True, None) for
+        strings that name no place ("Remote", "Earth"), and (False, None) when unsure.
+        """
+        if not location:
+            return False, None
+        text = normalize(location)
+        if text in self.nowhere:
+            return True, None
+
+        countries, places = set(), []
+        for part in re.split(r"[,/|;()]| - ", location):
+            part = normalize(part)
+            if not part or part in self.nowhere:
+                continue
+            for is_country, candidates, is_abbreviation in self._matchPart(part):
+                # "Austin, TX" but not "Hi!", "Co. Cork" or "TX" on its own
+                if is_abbreviation and not (countries or places):
+                    continue
+                if is_country and len(candidates) == 1:
+                    countries |= candidates
+                else:
+                    places.append(candidates)
+
+        # Named countries win over cities ("London, Canada"), several of them are unsure
+        if countries:
+            if len(countries) == 1:
+                return True, next(iter(countries))
+            return False, None
+        if places:
+            common = frozenset.intersection(*places)
+            if len(common) == 1:
+                return True, next(iter(common))
+        return False, None
+
+
+_gazetteer = None
+
+
+# Returns the gazetteer of this process, loaded on first use
+def getGazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer()
+    return _gazetteer
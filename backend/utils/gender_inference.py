@@ -0,0 +1,208 @@
+from openai import OpenAI
+from collections import OrderedDict
+from concurrent.futures import Future
+from dotenv import load_dotenv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import logging
+
+load_dotenv()
+
+API_KEY = os.getenv("API_KEY")
+# Inference backend: "openai" (chat completions) or "deterministic" (offline stand-in)
+GENDER_BACKEND = os.getenv("GENDER_BACKEND", "openai").lower()
+GENDER_MODEL = os.getenv("GENDER_MODEL", "gpt-4o-mini")
+# Names sent in one request, results memoized in memory, and how long (seconds) a lookup waits
+# for concurrent lookups to join its batch
+GENDER_BATCH_SIZE = int(os.getenv("GENDER_BATCH_SIZE", 20))
+GENDER_CACHE_SIZE = int(os.getenv("GENDER_CACHE_SIZE", 10000))
+GENDER_BATCH_WAIT = float(os.getenv("GENDER_BATCH_WAIT", 0.05))
+
+GENDERS = ("Male", "Female", "Unknown")
+
+
+# Memo key of a person, names differing only in case or spacing share a result
+def genderKey(name, country):
+    name = re.sub(r"\s+", " ", name or "").strip().lower()
+    return name, country
+
+
+class OpenAIGenderBackend:
+    """Infers the gender of many people with one structured chat completion."""
+
+    def __init__(self, model=GENDER_MODEL, api_key=API_KEY):
+        self.model = model
+        self.client = OpenAI(api_key=api_key)
+
+    def infer(self, people):
+        payload = [
+            {"full_name": name, "location": country} if country else {"full_name": name}
+            for name, country in people
+        ]
+        res = self.client.chat.completions.create(
+            model=self.model,
+            response_format={"type": "json_object"},
+            messages=[
+                {
+                    "role": "system",
+                    "content": """
+                        Infer gender of each person using their fullname (and location when given). Only output valid json in this format (Try not to output Unknown), with one entry per person in input order: { "genders": ["Male", "Female", "Unknown"] }
+                    """,
+                },
+                {
+                    "role": "user",
+                    "content": json.dumps(payload, ensure_ascii=False),
+                },
+            ],
+        )
+        output = json.loads(res.choices[0].message.content)
+        genders = output.get("genders", [])
+        if len(genders) != len(people):
+            if len(people) == 1:
+                raise ValueError(f"Unexpected gender inference output: {output}")
+            # The model lost track of the list, ask for each person separately
+            logging.warning(
+                "Gender batch returned the wrong count, retrying one by one"
+            )
+            return [self.infer([person])[0] for person in people]
+        return [gender if gender in GENDERS else "Unknown" for gender in genders]
+
+
+class DeterministicGenderBackend:
+    """
+    Offline stand-in for tests and benchmarks: derives a stable answer from a hash of the name.
+    `latency` (seconds per request) simulates the round trip of a real backend.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+
+    def infer(self, people):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [
+            GENDERS[hashlib.sha1(name.encode("utf-8")).digest()[0] % len(GENDERS)]
+            for name, _ in people
+        ]
+
+
+def createGenderBackend(name=GENDER_BACKEND):
+    if name == "deterministic":
+        return DeterministicGenderBackend()
+    if name == "openai":
+        return OpenAIGenderBackend()
+    raise ValueError(f"Unknown gender backend: {name}")
+
+
+class GenderService:
+    """
+    Memoized, batched gender inference shared by every thread of a worker.
+
+    Results are memoized by (normalized name, country). Lookups that miss are held for up to
+    `wait` seconds so concurrent enrichment threads share one backend request of up to
+    `batch_size` people; `inferMany` resolves a whole list directly.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        batch_size=GENDER_BATCH_SIZE,
+        cache_size=GENDER_CACHE_SIZE,
+        wait=GENDER_BATCH_WAIT,
+    ):
+        self.backend = backend or createGenderBackend()
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.wait = wait
+        self.memo = OrderedDict()
+        self.pending = {}
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def infer(self, name, country=None):
+        key = genderKey(name, country)
+        if not key[0]:
+            return "Unknown"
+
+        with self.lock:
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                return self.memo[key]
+            future = self.pending.get(key)
+            if future is None:
+                future = self.pending[key] = Future()
+            flush_now = len(self.pending) >= self.batch_size
+            if not flush_now and self.timer is None:
+                self.timer = threading.Timer(self.wait, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+        if flush_now:
+            self.flush()
+        return future.result()
+
+    # Returns the gender of every (name, country) pair, in order
+    def inferMany(self, people):
+        keys = [genderKey(name, country) for name, country in people]
+        with self.lock:
+            missing = list(
+                dict.fromkeys(key for key in keys if key[0] and key not in self.memo)
+            )
+        for i in range(0, len(missing), self.batch_size):
+            self._resolve(missing[i : i + self.batch_size])
+
+        with self.lock:
+            return [
+                self.memo.get(key, "Unknown") if key[0] else "Unknown" for key in keys
+            ]
+
+    # Sends every pending lookup to the backend
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not batch:
+            return
+
+        keys = list(batch)
+        for i in range(0, len(keys), self.batch_size):
+            chunk = keys[i : i + self.batch_size]
+            try:
+                genders = self._resolve(chunk)
+                for key, gender in zip(chunk, genders):
+                    batch[key].set_result(gender)
+            except Exception as e:
+                # Hand the error back to every thread waiting on this batch
+                for key in chunk:
+                    batch[key].set_exception(e)
+
+    def _resolve(self, keys):
+        genders = self.backend.infer(keys)
+        with self.lock:
+            for key, gender in zip(keys, genders):
+                self.memo[key] = gender
+                self.memo.move_to_end(key)
+            while len(self.memo) > self.cache_size:
+                self.memo.popitem(last=False)
+        return genders
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+# Returns the gender service of this process, created on first use
+def getGenderService():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = GenderService()
+        return _service
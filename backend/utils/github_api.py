@@ -1,36 +1,222 @@
 import requests
+import httpx
+import asyncio
+import threading
 import time
 import os
 import logging
+from datetime import datetime
 from dotenv import load_dotenv
+from backend.utils.http_session import getSession, HTTP_POOL_SIZE
 
 
 load_dotenv()
 GITHUB_TOKEN = os.getenv("PAT")
+# Several PATs can be provided as a comma separated list, PAT is used when PATS is not set
+GITHUB_TOKENS = [
+    token.strip() for token in os.getenv("PATS", "").split(",") if token.strip()
+] or [GITHUB_TOKEN]
+# Number of requests that may be sent back to back before pacing spaces them out
+PACING_BURST = int(os.getenv("PACING_BURST", 10))
+
+
+class TokenPool:
+    """
+    Tracks the rate limit budget of every configured PAT and routes requests between them.
+
+    Budgets are kept per token and per API resource ("core" for REST, "graphql" for GraphQL),
+    since GitHub meters both separately. A token whose window has reset (or that has not been
+    used yet) is considered to have a full budget.
+    """
+
+    def __init__(self, tokens, burst=PACING_BURST):
+        self.tokens = list(tokens)
+        # (token, resource) -> [remaining, reset epoch seconds]
+        self.budgets = {}
+        self.lock = threading.Lock()
+        # resource -> (allowance, last refill), token bucket used to pace requests
+        self.burst = burst
+        self.buckets = {}
+
+    def next_token(self, resource):
+        """
+        Picks the token with the most remaining budget for `resource` and reserves one request on it.
+
+        Returns a `(token, wait)` tuple. `wait` is 0 unless every token is exhausted, in which case
+        it is the number of seconds until the earliest reset and the returned token is that one.
+        """
+        now = time.time()
+        with self.lock:
+            best, best_remaining = None, -1
+            earliest, earliest_reset = None, None
+            for token in self.tokens:
+                budget = self.budgets.get((token, resource))
+                # Unknown budget or a rolled over window, this token is as good as it gets
+                if budget is None or budget[1] <= now:
+                    return token, 0
+                remaining, reset = budget
+                if remaining > best_remaining:
+                    best, best_remaining = token, remaining
+                if earliest_reset is None or reset < earliest_reset:
+                    earliest, earliest_reset = token, reset
+
+            if best_remaining > 0:
+                self.budgets[(best, resource)][0] -= 1
+                return best, 0
+            return earliest, earliest_reset - now
+
+    def pace(self, resource):
+        """
+        Reserves a request slot for `resource` and returns how long to wait before sending it.
+
+        The bucket refills at the rate the pool can sustain until the windows reset (the sum of
+        remaining / seconds until reset over all tokens), so the budget is spread evenly across the
+        window instead of being spent up front and then waiting out the reset.
+        """
+        now = time.time()
+        with self.lock:
+            rate = 0.0
+            for token in self.tokens:
+                budget = self.budgets.get((token, resource))
+                # Until every token has reported its budget there is nothing to pace against
+                if budget is None or budget[1] <= now:
+                    return 0
+                rate += budget[0] / max(budget[1] - now, 1)
+            if rate <= 0:
+                return 0
+
+            allowance, last = self.buckets.get(resource, (self.burst, now))
+            allowance = min(self.burst, allowance + (now - last) * rate) - 1
+            self.buckets[resource] = (allowance, now)
+            return 0 if allowance >= 0 else -allowance / rate
+
+    def update(self, token, resource, remaining, reset):
+        with self.lock:
+            self.budgets[(token, resource)] = [int(remaining), float(reset)]
+
+    # Records the X-RateLimit-* headers returned with a response made using `token`
+    def update_from_headers(self, token, headers, resource):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        resource = headers.get("X-RateLimit-Resource", resource)
+        self.update(token, resource, remaining, reset)
+
+    # Records the `rateLimit { cost remaining resetAt }` object of a GraphQL response
+    def update_from_graphql(self, token, rate_limit):
+        if not rate_limit or rate_limit.get("remaining") is None:
+            return
+        reset = datetime.fromisoformat(rate_limit["resetAt"].replace("Z", "+00:00"))
+        self.update(token, "graphql", rate_limit["remaining"], reset.timestamp())
+
+    # Blocks until a token with remaining budget is available and its paced slot has come, then returns it
+    def acquire(self, resource):
+        while True:
+            token, wait = self.next_token(resource)
+            if wait <= 0:
+                break
+            resetTokens(time.time() + wait)
+        delay = self.pace(resource)
+        if delay > 0:
+            time.sleep(delay)
+        return token
+
+    # Async counterpart of acquire, only suspends the calling coroutine
+    async def async_acquire(self, resource):
+        while True:
+            token, wait = self.next_token(resource)
+            if wait <= 0:
+                break
+            await asyncResetTokens(time.time() + wait)
+        delay = self.pace(resource)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return token
+
+
+TOKEN_POOL = TokenPool(GITHUB_TOKENS)
+
+
+# Returns True if a response was rejected because the token ran out of budget
+# REST answers with a 403/429, GraphQL with a 200 carrying a RATE_LIMITED error
+def isRateLimited(res):
+    if res.status_code in (403, 429):
+        return res.headers.get("X-RateLimit-Remaining") == "0"
+    if res.status_code == 200:
+        try:
+            body = res.json()
+        except ValueError:
+            return False
+        errors = body.get("errors") if isinstance(body, dict) else None
+        return any(
+            isinstance(error, dict) and error.get("type") == "RATE_LIMITED"
+            for error in errors or []
+        )
+    return False
+
+
+# Marks the token exhausted until its reported reset (a minute when none is reported),
+# so the pool routes the retry to another token or waits for the earliest reset
+def markRateLimited(token, res, resource):
+    reset = res.headers.get("X-RateLimit-Reset") or time.time() + 60
+    TOKEN_POOL.update(token, resource, 0, reset)
+
+
+# Returns the seconds GitHub asks to wait after a secondary rate limit, or None
+def retryAfter(res):
+    if res.status_code in (403, 429) and "Retry-After" in res.headers:
+        return int(res.headers["Retry-After"])
+    return None
+
+
+# Records the GraphQL rateLimit object of a response, if the query requested one
+def recordGraphQLRateLimit(token, json, res):
+    if json and "rateLimit" in json.get("query", ""):
+        try:
+            rate_limit = (res.json().get("data") or {}).get("rateLimit")
+        except ValueError:
+            return
+        TOKEN_POOL.update_from_graphql(token, rate_limit)
+
+
+# Adds the conditional request headers for previously stored validators of a url
+def conditionalHeaders(headers, etag=None, last_modified=None):
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
 
 
 # Function to automatically detect API limits if they occur when running GET requests
-def getRequest(url):
-    headers = {
-        "Authorization": f"Bearer {GITHUB_TOKEN}",
-    }
+# When validators are passed, an unchanged resource is answered with a 304 (not counted against the rate limit)
+def getRequest(url, etag=None, last_modified=None):
     while True:
-        res = requests.get(url=url, headers=headers)
+        token = TOKEN_POOL.acquire("core")
+        headers = conditionalHeaders(
+            {"Authorization": f"Bearer {token}"}, etag, last_modified
+        )
+        res = getSession().get(url=url, headers=headers)
+        TOKEN_POOL.update_from_headers(token, res.headers, "core")
 
-        if res.status_code == 200:
+        if res.status_code in (200, 304):
             return res
-        elif res.status_code == 403:
+        elif res.status_code in (403, 429):
             if "Repository access blocked" in res.text:
                 logging.warning(
                     f"{res.status_code}: Repository access blocked, Skipping. {url}"
                 )
                 return [], res.headers
-            remaining = res.headers.get("X-RateLimit-Remaining")
-            reset = res.headers.get("X-RateLimit-Reset")
 
-            # If API request tokens remaining hits 0
-            if remaining == "0" and reset:
-                resetTokens(reset)
+            # If API request tokens remaining hits 0, retry with the next token in the pool
+            if isRateLimited(res):
+                markRateLimited(token, res, "core")
+                continue
+            # Secondary rate limit, back off for as long as GitHub asks
+            elif retryAfter(res) is not None:
+                logging.warning(f"Secondary rate limit hit. Waiting {retryAfter(res)}s")
+                time.sleep(retryAfter(res))
                 continue
             else:
                 logging.error(f"{res.status_code}: API ERROR: {res.text}")
@@ -55,29 +241,36 @@ def postRequest(url, json=None, initial_delay=2, max_retries=5, timeout=30):
     Returns:
         requests.Response: The response object on success.
     """
-    headers = {
-        "Authorization": f"Bearer {GITHUB_TOKEN}",
-        "Content-Type": "application/json",
-    }
-
-    for attempt in range(max_retries):
+    attempt = 0
+    while attempt < max_retries:
+        token = TOKEN_POOL.acquire("graphql")
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
         try:
-            response = requests.post(
+            response = getSession().post(
                 url=url, headers=headers, json=json, timeout=timeout
             )
+            TOKEN_POOL.update_from_headers(token, response.headers, "graphql")
 
-            # Check for rate limiting on every response
-            if (
-                "X-RateLimit-Remaining" in response.headers
-                and response.headers["X-RateLimit-Remaining"] == "0"
-            ):
-                resetTokens(response.headers.get("X-RateLimit-Reset"))
-                # After waiting, we should retry the request, so we continue the loop
-                logging.info("Rate limit reset. Waiting for tokens to refresh.")
+            # Rejected for rate limiting, the pool routes the retry to another token
+            # (or waits for the earliest reset), so this does not count as an attempt
+            if isRateLimited(response):
+                logging.info("Rate limit hit for current token. Switching tokens.")
+                markRateLimited(token, response, "graphql")
+                continue
+            # Secondary rate limit, back off for as long as GitHub asks
+            if retryAfter(response) is not None:
+                logging.warning(
+                    f"Secondary rate limit hit. Waiting {retryAfter(response)}s"
+                )
+                time.sleep(retryAfter(response))
                 continue
 
             # Raise an exception for any non-200 status codes
             response.raise_for_status()
+            recordGraphQLRateLimit(token, json, response)
 
             # If we get here, the request was successful (2xx status code)
             print(
@@ -113,19 +306,141 @@ def postRequest(url, json=None, initial_delay=2, max_retries=5, timeout=30):
         delay = initial_delay * (2**attempt)
         logging.info(f"Retrying in {delay} seconds...")
         time.sleep(delay)
+        attempt += 1
 
     # If the loop completes without returning, it means all retries have failed.
     raise Exception(f"API request failed for {url} after {max_retries} attempts.")
 
 
-# If API limit is hit during an api request, calculate the time remaining till tokens refresh and sleep worker
+# If every token in the pool is exhausted, calculate the time remaining till the earliest reset and sleep worker
 def resetTokens(reset):
-    reset_time = int(reset)
-    now = int(time.time())
-    sleep_time = reset_time - now
-    print(f"\n\n[Rate Limit Hit] Sleeping {sleep_time} seconds...")
-    for i in range(sleep_time + 5):
-        print(f"\rCurrent Time Slept: {i} seconds", end="", flush=True)
-        time.sleep(1)
-    print("\nGithub Tokens Restored!\n\n")
+    sleep_time = max(int(reset) - int(time.time()), 0) + 5
+    logging.warning(f"[Rate Limit Hit] Sleeping {sleep_time} seconds...")
+    time.sleep(sleep_time)
+    logging.info("Github Tokens Restored!")
     return
+
+
+# Creates the shared non-blocking HTTP client used by the concurrent crawl engine
+def createAsyncClient(concurrency=HTTP_POOL_SIZE, timeout=30):
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    return httpx.AsyncClient(
+        limits=limits, timeout=timeout, headers={"Accept-Encoding": "gzip, deflate"}
+    )
+
+
+# Async counterpart of getRequest for the concurrent crawl engine
+async def asyncGetRequest(client, url, etag=None, last_modified=None):
+    while True:
+        token = await TOKEN_POOL.async_acquire("core")
+        headers = conditionalHeaders(
+            {"Authorization": f"Bearer {token}"}, etag, last_modified
+        )
+        res = await client.get(url, headers=headers)
+        TOKEN_POOL.update_from_headers(token, res.headers, "core")
+
+        if res.status_code in (200, 304):
+            return res
+        elif res.status_code in (403, 429):
+            if "Repository access blocked" in res.text:
+                logging.warning(
+                    f"{res.status_code}: Repository access blocked, Skipping. {url}"
+                )
+                return [], res.headers
+
+            if isRateLimited(res):
+                markRateLimited(token, res, "core")
+                continue
+            elif retryAfter(res) is not None:
+                logging.warning(f"Secondary rate limit hit. Waiting {retryAfter(res)}s")
+                await asyncio.sleep(retryAfter(res))
+                continue
+            else:
+                logging.error(f"{res.status_code}: API ERROR: {res.text}")
+                raise Exception(f"403 Forbidden, not due to rate limit: {res.text}")
+        else:
+            res.raise_for_status()
+
+
+# Async counterpart of postRequest, awaiting instead of blocking while retrying or rate limited
+async def asyncPostRequest(
+    client, url, json=None, initial_delay=2, max_retries=5, timeout=30
+):
+    """Sends a POST request through the shared async client with the same retry policy as `postRequest`.
+    Args:
+        client (httpx.AsyncClient): Client created by `createAsyncClient`.
+        url (str): The URL to send the request to.
+        json (dict, optional): The JSON payload for the request. Defaults to None.
+        initial_delay (int, optional): Initial delay in seconds for retries. Defaults to 2.
+        max_retries (int, optional): Maximum number of retries. Defaults to 5.
+        timeout (int, optional): Request timeout in seconds. Defaults to 30.
+    Raises:
+        httpx.HTTPStatusError: For client-side errors (4xx).
+        Exception: If the request fails after all retries.
+    Returns:
+        httpx.Response: The response object on success.
+    """
+    attempt = 0
+    while attempt < max_retries:
+        token = await TOKEN_POOL.async_acquire("graphql")
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+        try:
+            response = await client.post(
+                url, headers=headers, json=json, timeout=timeout
+            )
+            TOKEN_POOL.update_from_headers(token, response.headers, "graphql")
+
+            if isRateLimited(response):
+                logging.info("Rate limit hit for current token. Switching tokens.")
+                markRateLimited(token, response, "graphql")
+                continue
+            if retryAfter(response) is not None:
+                logging.warning(
+                    f"Secondary rate limit hit. Waiting {retryAfter(response)}s"
+                )
+                await asyncio.sleep(retryAfter(response))
+                continue
+
+            response.raise_for_status()
+            recordGraphQLRateLimit(token, json, response)
+            return response
+
+        except httpx.HTTPStatusError as e:
+            # Only retry on server-side errors (5xx)
+            if 500 <= e.response.status_code < 600:
+                logging.warning(
+                    f"Server error ({e.response.status_code}) received. (Attempt {attempt + 1}/{max_retries})"
+                )
+            else:
+                logging.error(
+                    f"Client error ({e.response.status_code}) received. Not retrying. Error: {e}"
+                )
+                raise
+
+        except (httpx.TransportError, httpx.TimeoutException) as e:
+            logging.warning(
+                f"Network error ({type(e).__name__}) occurred. (Attempt {attempt + 1}/{max_retries})"
+            )
+
+        if attempt == max_retries - 1:
+            break
+
+        delay = initial_delay * (2**attempt)
+        logging.info(f"Retrying in {delay} seconds...")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+    raise Exception(f"API request failed for {url} after {max_retries} attempts.")
+
+
+# Non-blocking version of resetTokens, only suspends the coroutine that hit the limit
+async def asyncResetTokens(reset):
+    sleep_time = max(int(reset) - int(time.time()), 0) + 5
+    logging.warning(f"[Rate Limit Hit] Sleeping {sleep_time} seconds...")
+    await asyncio.sleep(sleep_time)
+    logging.info("Github Tokens Restored!")
@@ -0,0 +1,32 @@
+import threading
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+
+load_dotenv()
+# Connections kept alive per host by each session
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+
+_local = threading.local()
+
+
+# Builds a session with keep-alive connection pooling for the hosts the backend talks to
+def createSession(pool_size=HTTP_POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Responses are decompressed transparently by requests
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+# Returns the calling thread's session, so connections are reused without sharing a session between threads
+def getSession():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = createSession()
+        _local.session = session
+    return session